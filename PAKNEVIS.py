@@ -1,12 +1,39 @@
 import os
 import re
+import sys
 import json
-import uno
-import unohelper
-from com.sun.star.awt import MessageBoxButtons as MBButtons
-from com.sun.star.awt.MessageBoxType import MESSAGEBOX
-from com.sun.star.awt import XTopWindowListener
+import argparse
+import time
+import difflib
+import shutil
+import hashlib
+import struct
+import mmap
+import zlib
+import importlib
+import xml.parsers.expat
+try:
+    import uno
+    import unohelper
+    from com.sun.star.awt import MessageBoxButtons as MBButtons
+    from com.sun.star.awt.MessageBoxType import MESSAGEBOX, QUERYBOX
+    from com.sun.star.awt.MessageBoxResults import YES as MESSAGE_BOX_YES
+    from com.sun.star.awt import XTopWindowListener, XCallback
+    from com.sun.star.util import XModifyListener
+except ImportError:
+    # اجرا بیرون از لیبره‌آفیس (حالت خط فرمان)؛ بخش‌های UNO فقط در ماکرو به کار می‌روند
+    uno = unohelper = None
+try:
+    import sqlite3
+except ImportError:
+    # بعضی نسخه‌های پایتون همراه لیبره‌آفیس sqlite3 ندارند؛ حافظهٔ نهان فقط در حافظه می‌ماند
+    sqlite3 = None
 import datetime
+import threading
+from collections import Counter, OrderedDict
+from itertools import accumulate
+from bisect import bisect_left
+from collections.abc import Mapping
 from urllib.parse import unquote, urlparse
 from enum import Enum, auto # <-- وارد کردن کتابخانه Enum
 
@@ -17,6 +44,13 @@ BASE_DIR = os.path.join(os.path.expanduser("~"), ".config", "libreoffice", "4",
 CONFIG_FILE = os.path.join(BASE_DIR, "TextFixer.conf")
 REPLACEMENTS_FILE = os.path.join(BASE_DIR, "DocumentList.json")
 LOG_FILE = os.path.join(BASE_DIR, "TextFixer.log")
+CACHE_FILE = os.path.join(BASE_DIR, "Paknevis.cache")
+# تنظیم‌های غیرگزینه‌ای در TextFixer.conf: METRICS=1 سنجش زمان مراحل را روشن می‌کند،
+# NATIVE_REPLACE=1 مراحل نویسه‌ای را در ماکرو به جست‌وجو و جایگزینی خود لیبره‌آفیس می‌سپارد
+# و BACKGROUND=0 اصلاح کل سند را به جای پس‌زمینه در همان لحظه (با قفل شدن پنجره) انجام می‌دهد
+METRICS_SETTING = "METRICS"
+NATIVE_SETTING = "NATIVE_REPLACE"
+BACKGROUND_SETTING = "BACKGROUND"
 
 # ---------- تعریف Enum برای تنظیمات 
 class FixOption(Enum):
@@ -76,31 +110,249 @@ def log_error(section, exc):
     except Exception:
         pass
 
+EN_DIGITS, AR_DIGITS, FA_DIGITS = "0123456789", "٠١٢٣٤٥٦٧٨٩", "۰۱۲۳۴۵۶۷۸۹"
+EN_TO_FA_DIGITS = str.maketrans(EN_DIGITS, FA_DIGITS)
+AR_TO_FA_DIGITS = str.maketrans(AR_DIGITS, FA_DIGITS)
+
 # تبدیل اعداد انگلیسی به فارسی
 def en_numbers_to_fa(text):
-    return text.translate(str.maketrans("0123456789", "۰۱۲۳۴۵۶۷۸۹"))
+    return text.translate(EN_TO_FA_DIGITS)
 
 # تبدیل اعداد عربی به فارسی
 def ar_numbers_to_fa(text):
-    return text.translate(str.maketrans("٠١٢٣٤٥٦٧٨٩", "۰۱۲۳۴۵۶۷۸۹"))
+    return text.translate(AR_TO_FA_DIGITS)
+
+# بانک واژه‌ها تا نخستین استفاده بارگذاری نمی‌شود (None یعنی هنوز بارگذاری نشده)
+REPLACEMENTS = None
+
+# منبع پیش‌فرض بانک: DocumentList.json و در نبودش DocumentList.xml خودتصحیح لیبره‌آفیس
+def default_replacements_source():
+    xml_source = os.path.join(BASE_DIR, "DocumentList.xml")
+    return xml_source if not os.path.exists(REPLACEMENTS_FILE) and os.path.exists(xml_source) else REPLACEMENTS_FILE
+
+def get_replacements():
+    global REPLACEMENTS
+    if REPLACEMENTS is None: REPLACEMENTS = load_replacement_bank(default_replacements_source())
+    return REPLACEMENTS
+
+# جایگزینی بانک واژه‌ها با فایلی دیگر (JSON یا XML؛ مثلاً در حالت خط فرمان)
+def use_replacements(path):
+    global REPLACEMENTS
+    REPLACEMENTS = load_replacement_bank(path)
+    return REPLACEMENTS
+
+# ---------- تطبیق‌دهندهٔ بانک واژه‌ها ----------
+# همان تعریف \w در ماژول re برای رشته‌های یونی‌کد
+def is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+# معادل \b در ماژول re: مرز میان نویسهٔ واژه و غیرواژه
+def is_word_boundary(text, pos):
+    before = pos > 0 and is_word_char(text[pos-1])
+    after = pos < len(text) and is_word_char(text[pos])
+    return before != after
+
+_DICT_MATCHER = None
+
+# تطبیق‌دهندهٔ بانک فعلی را فقط یک بار (و پس از هر بارگذاری دوباره) می‌سازد
+def get_dict_matcher():
+    global _DICT_MATCHER
+    replacements = get_replacements()
+    if _DICT_MATCHER is None or _DICT_MATCHER.replacements is not replacements:
+        _DICT_MATCHER = BankMatcher(replacements)
+    return _DICT_MATCHER
+
+# ---------- بانک کامپایل‌شدهٔ واژه‌ها ----------
+# منبع (DocumentList.json یا DocumentList.xml خودتصحیح لیبره‌آفیس) یک بار به فایل دودویی فشرده تبدیل
+# و سپس با mmap خوانده می‌شود؛ صفحه‌هایش میان پردازه‌ها مشترک است و فقط با تغییر منبع از نو ساخته می‌شود.
+# ساختار: سرآیند، نخستین نویسه‌های واژه‌ها، آرایهٔ مرتب (آغاز و طول کلید و مقدار)، جدول درهم‌سازی
+# crc32 ← شمارهٔ کلید، صافی بلوم پیشوندهای کلیدها (تا مرزهای واژهٔ درونشان) و در پایان خود رشته‌ها.
+BANK_MAGIC = b"PKNBANK1"
+BANK_HEADER = struct.Struct("<8sQQ16sIIII")  # نشان، اندازه، mtime_ns و چکیدهٔ منبع، تعداد، خانه‌ها، بیشینهٔ طول، طول نویسه‌های آغازین
+BANK_ENTRY = struct.Struct("<IIII")
+BANK_SLOT = struct.Struct("<I")
+BLOCK_LIST_NS = "http://openoffice.org/2001/block-list"
+
+# خواندن DocumentList.xml (فهرست خودتصحیح لیبره‌آفیس): abbreviated-name نادرست و name درست است
+def parse_block_list(data):
+    replacements = {}
+    def start(name, attrs):
+        if name == f"{BLOCK_LIST_NS} block":
+            wrong, correct = attrs.get(f"{BLOCK_LIST_NS} abbreviated-name"), attrs.get(f"{BLOCK_LIST_NS} name")
+            if wrong and correct: replacements[wrong] = correct
+    parser = xml.parsers.expat.ParserCreate(namespace_separator=" ")
+    parser.StartElementHandler = start
+    parser.Parse(data, True)
+    return replacements
+
+def parse_replacement_source(path, data):
+    if path.lower().endswith(".xml"): return parse_block_list(data)
+    replacements = {}
+    for words in json.loads(data.decode("utf-8")).get("words", []):
+        wrong, correct = words.get("wrong"), words.get("correct")
+        if wrong and correct: replacements[wrong] = correct
+    return replacements
+
+# پیشوندهای کلید که به یکی از مرزهای واژهٔ درون آن ختم می‌شوند
+def inner_boundary_prefixes(key):
+    return [key[:pos] for pos in range(1, len(key)) if is_word_char(key[pos-1]) != is_word_char(key[pos])]
+
+def build_bank_index(replacements, size=0, mtime_ns=0, digest=b"\0" * 16):
+    items = sorted((k.encode("utf-8"), v.encode("utf-8")) for k, v in replacements.items() if k and v)
+    slots = 8
+    while slots < 2 * len(items): slots *= 2
+    first_chars = "".join(sorted({k.decode("utf-8")[0] for k, _ in items})).encode("utf-8")
+    max_len = max((len(k.decode("utf-8")) for k, _ in items), default=0)
+    entries_at = BANK_HEADER.size + len(first_chars)
+    slots_at = entries_at + BANK_ENTRY.size * len(items)
+    bloom_at = slots_at + BANK_SLOT.size * slots
+    strings_at = bloom_at + slots
+    entries, table, bloom, strings = bytearray(), [0] * slots, bytearray(slots), bytearray()
+    for index, (key, value) in enumerate(items):
+        entries += BANK_ENTRY.pack(strings_at + len(strings), len(key), strings_at + len(strings) + len(key), len(value))
+        strings += key + value
+        slot = zlib.crc32(key) & (slots - 1)
+        while table[slot]: slot = (slot + 1) & (slots - 1)
+        table[slot] = index + 1
+        for prefix in inner_boundary_prefixes(key.decode("utf-8")):
+            bit = zlib.crc32(prefix.encode("utf-8")) % (slots * 8)
+            bloom[bit >> 3] |= 1 << (bit & 7)
+    header = BANK_HEADER.pack(BANK_MAGIC, size, mtime_ns, digest, len(items), slots, max_len, len(first_chars))
+    return b"".join([header, first_chars, bytes(entries), struct.pack(f"<{slots}I", *table), bytes(bloom), bytes(strings)])
+
+class ReplacementBank(Mapping):
+    """بانک واژه‌ها روی فایل کامپایل‌شده (mmap) یا بایت‌های ساخته‌شده در حافظه؛ مانند dict خوانده می‌شود
+    ولی کلیدها و مقدارها فقط هنگام نیاز از بافر خوانده می‌شوند."""
+
+    def __init__(self, buffer, source=None):
+        self.buffer, self.source = buffer, source
+        magic, self.source_size, self.source_mtime_ns, digest, self.count, self.slots, self.max_len, first_len = \
+            BANK_HEADER.unpack_from(buffer, 0)
+        if magic != BANK_MAGIC: raise ValueError("not a Paknevis bank index")
+        self.digest, self.version = digest, digest.hex()[:16]
+        self.first_chars = frozenset(bytes(buffer[BANK_HEADER.size:BANK_HEADER.size + first_len]).decode("utf-8"))
+        self._entries_at = BANK_HEADER.size + first_len
+        self._slots_at = self._entries_at + BANK_ENTRY.size * self.count
+        self._bloom_at = self._slots_at + BANK_SLOT.size * self.slots
+
+    # مقدار کلیدی که بایت‌ها و crc32 آن داده شده، یا None
+    def lookup(self, key, crc):
+        buffer, mask = self.buffer, self.slots - 1
+        slot = crc & mask
+        while True:
+            index = BANK_SLOT.unpack_from(buffer, self._slots_at + 4 * slot)[0]
+            if not index: return None
+            key_at, key_len, value_at, value_len = BANK_ENTRY.unpack_from(buffer, self._entries_at + BANK_ENTRY.size * (index - 1))
+            if key_len == len(key) and buffer[key_at:key_at + key_len] == key:
+                return bytes(buffer[value_at:value_at + value_len]).decode("utf-8")
+            slot = (slot + 1) & mask
+
+    # آیا ممکن است کلیدی بلندتر با این تکه (با همین crc32) آغاز شود؟ (صافی بلوم؛ مثبت کاذب بی‌ضرر است)
+    def may_extend(self, crc):
+        bit = crc % (self.slots * 8)
+        return self.buffer[self._bloom_at + (bit >> 3)] & (1 << (bit & 7)) != 0
+
+    def _key(self, index):
+        key_at, key_len, _, _ = BANK_ENTRY.unpack_from(self.buffer, self._entries_at + BANK_ENTRY.size * index)
+        return bytes(self.buffer[key_at:key_at + key_len]).decode("utf-8")
+
+    def __getitem__(self, key):
+        encoded = key.encode("utf-8")
+        value = self.lookup(encoded, zlib.crc32(encoded))
+        if value is None: raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return (self._key(index) for index in range(self.count))
 
-# بارگذاری فهرست جایگزینی واژه‌ها از فایل JSON
-def load_replacements(path):
+    def __len__(self):
+        return self.count
+
+# مسیر فایل کامپایل‌شدهٔ هر منبع در پوشهٔ ماکرو
+def bank_index_path(source):
+    tag = hashlib.blake2b(os.path.abspath(source).encode("utf-8"), digest_size=4).hexdigest()
+    return os.path.join(BASE_DIR, f"{os.path.basename(source)}.{tag}.pkbank")
+
+def _open_bank_index(path):
+    with open(path, "rb") as f:
+        return ReplacementBank(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), path)
+
+# بانک آمادهٔ یک منبع: فایل کامپایل‌شده اگر هنوز با اندازه و mtime (یا چکیدهٔ) منبع می‌خواند، وگرنه ساخت دوباره.
+# اگر نوشتن فایل ممکن نباشد بانک در حافظه ساخته می‌شود؛ منبع ناموجود یا خراب بانک خالی می‌دهد.
+def load_replacement_bank(source, index_path=None):
+    index_path = index_path or bank_index_path(source)
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        replacements = {}
-        for words in data.get("words", []):
-            wrong = words.get("wrong")
-            correct = words.get("correct")
-            if wrong and correct:
-                replacements[wrong] = correct
-        return replacements
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        log_error("load_replacements", e)
+        st = os.stat(source)
+        bank = None
+        try: bank = _open_bank_index(index_path)
+        except (OSError, ValueError, struct.error): pass
+        if bank and (bank.source_size, bank.source_mtime_ns) == (st.st_size, st.st_mtime_ns): return bank
+        with open(source, "rb") as f: data = f.read()
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        if bank and bank.digest == digest:
+            # فقط زمان منبع عوض شده؛ مهر سرآیند تازه می‌شود تا بار بعد دوباره چکیده گرفته نشود
+            bank.source_size, bank.source_mtime_ns = st.st_size, st.st_mtime_ns
+            try:
+                with open(index_path, "r+b") as f:
+                    f.write(BANK_HEADER.pack(BANK_MAGIC, st.st_size, st.st_mtime_ns, digest, bank.count, bank.slots,
+                                             bank.max_len, len("".join(bank.first_chars).encode("utf-8"))))
+            except OSError as e: log_error("load_replacement_bank - stamp index", e)
+            return bank
+        index = build_bank_index(parse_replacement_source(source, data), st.st_size, st.st_mtime_ns, digest)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+            tmp_path = f"{index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f: f.write(index)
+            os.replace(tmp_path, index_path)
+            return _open_bank_index(index_path)
+        except OSError as e:
+            log_error("load_replacement_bank - write index", e)
+            return ReplacementBank(index, source)
+    except (OSError, ValueError, AttributeError, xml.parsers.expat.ExpatError) as e:
+        log_error("load_replacement_bank", e)
         return {}
 
-REPLACEMENTS = load_replacements(REPLACEMENTS_FILE)
+class BankMatcher:
+    """در هر موضع، طولانی‌ترین واژهٔ بانک که دو سرش روی مرز واژه باشد جایگزین می‌شود. خودکاره‌ای در حافظه
+    ساخته نمی‌شود: از هر مرز واژه که نویسهٔ بعدش آغاز کلیدی باشد، تکه‌ها تا مرزهای بعدی در جدول
+    درهم‌سازی بانک جست‌وجو می‌شوند و صافی پیشوندها جست‌وجو را زود قطع می‌کند."""
+
+    MEMO_ENTRIES = 50000
+
+    def __init__(self, bank):
+        self.replacements = bank
+        self._memo = {}  # تکه ← (مقدار یا None, ادامه ممکن است؟)؛ واژه‌های پرتکرار فقط یک بار جست‌وجو می‌شوند
+
+    def _probe(self, piece):
+        encoded = piece.encode("utf-8")
+        crc = zlib.crc32(encoded)
+        if len(self._memo) >= self.MEMO_ENTRIES: self._memo.clear()
+        found = self._memo[piece] = (self.replacements.lookup(encoded, crc), self.replacements.may_extend(crc))
+        return found
+
+    # با spans (یک فهرست) بازهٔ هر جایگزینی به صورت (آغاز, پایان, مقدار) بر حسب متن ورودی هم افزوده می‌شود
+    def subn(self, text, spans=None):
+        bank, memo, probe = self.replacements, self._memo, self._probe
+        first_chars, max_len = bank.first_chars, bank.max_len
+        bounds = [pos for m in WORD_RUN_PATTERN.finditer(text) for pos in m.span()]
+        parts, pos, n, size = [], 0, 0, len(bounds)
+        for i, start in enumerate(bounds):
+            if start < pos or start >= len(text) or text[start] not in first_chars: continue
+            best = None
+            for j in range(i + 1, size):
+                end = bounds[j]
+                if end - start > max_len: break
+                piece = text[start:end]
+                value, extend = memo.get(piece) or probe(piece)
+                if value is not None: best = (end, value)
+                if not extend: break
+            if best:
+                parts.append(text[pos:start]); parts.append(best[1])
+                if spans is not None: spans.append((start, best[0], best[1]))
+                pos = best[0]; n += 1
+        if not n: return text, 0
+        parts.append(text[pos:])
+        return "".join(parts), n
 
 # فهرست افعال ساده برای پردازش پیشوندها
 simple_verbs = [
@@ -111,12 +363,16 @@ simple_verbs = [
 ]
 
 # بارگذاری تنظیمات کاربر از فایل یا استفاده از پیش‌فرض‌ها
-def load_config():
+def load_config(path=None):
+    path = path or CONFIG_FILE
     defaults = FixOption.get_defaults()
-    if not os.path.exists(CONFIG_FILE):
+    defaults[METRICS_SETTING] = False
+    defaults[NATIVE_SETTING] = False
+    defaults[BACKGROUND_SETTING] = True
+    if not os.path.exists(path):
         return defaults
     try:
-        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             lines = f.readlines()
         for line in lines:
             if "=" not in line:
@@ -137,6 +393,16 @@ def save_config(options):
     except Exception as e:
         log_error("save_config", e)
 
+# جمع کردن شمارش‌های یک گزارش در گزارشی دیگر
+def merge_report_counts(total, report_counts):
+    for k, v in report_counts.items():
+        total[k] = total.get(k, 0) + v
+    return total
+
+# سطرهای متنی گزارش (فقط دسته‌هایی که اصلاحی داشته‌اند)
+def format_report_lines(report_counts):
+    return [f"{k}: {en_numbers_to_fa(str(v))}" for k, v in report_counts.items() if v > 0]
+
 # تابع مرکزی برای مقداردهی اولیه دیکشنری گزارش
 def get_initial_report_counts():
     return {
@@ -150,13 +416,14 @@ def get_initial_report_counts():
     }
 
 # ---------- کلاس و دیالوگ ----------
-class MyTopWindowListener(unohelper.Base, XTopWindowListener):
-    def windowClosing(self, ev):
-        try: ev.Source.dispose()
-        except Exception as e: log_error("MyTopWindowListener.windowClosing", e)
-    def windowClosed(self, ev): pass
-    def windowActivated(self, ev): pass
-    def windowDeactivated(self, ev): pass
+if unohelper is not None:
+    class MyTopWindowListener(unohelper.Base, XTopWindowListener):
+        def windowClosing(self, ev):
+            try: ev.Source.dispose()
+            except Exception as e: log_error("MyTopWindowListener.windowClosing", e)
+        def windowClosed(self, ev): pass
+        def windowActivated(self, ev): pass
+        def windowDeactivated(self, ev): pass
 
 # --- تابع اصلاح‌شده ---
 def show_dialog(options):
@@ -227,7 +494,8 @@ def show_dialog(options):
         
         # --- منطق اصلاح‌شده ---
         if result == 1:  # فقط اگر روی دکمه "اجرا" کلیک شد
-            selected = {key: dialog.getControl(key).getState() == 1 for key, _ in items}
+            selected = dict(options)  # تنظیماتی که در دیالوگ نیستند (مثل METRICS) حفظ می‌شوند
+            selected.update({key: dialog.getControl(key).getState() == 1 for key, _ in items})
             save_config(selected)
             dialog.dispose()
             return True, selected  # بازگشت True و تنظیمات جدید
@@ -241,7 +509,107 @@ def show_dialog(options):
         except: pass
         return False, options.copy() # در صورت خطا هم انصراف را برگردان
 
+# ---------- جدول یکپارچهٔ اصلاحات نویسه‌ای ----------
+# هر گزینه: {نویسهٔ نادرست: (نویسهٔ درست, دستهٔ گزارش)}؛ دستهٔ None یعنی جایگزینی بدون شمارش
+CHAR_FIXES = {
+    FixOption.FIX_K_Y.name: {"ك": ("ک", "کاف عربی"), "ي": ("ی", "ی عربی")},
+    FixOption.FIX_NUMBERS_EN.name: {en: (fa, "اعداد انگلیسی") for en, fa in zip(EN_DIGITS, FA_DIGITS)},
+    FixOption.FIX_NUMBERS_AR.name: {ar: (fa, "اعداد عربی") for ar, fa in zip(AR_DIGITS, FA_DIGITS)},
+    FixOption.FIX_PUNCT.name: {",": ("،", "ویرگول انگلیسی"), ";": ("؛", "نقطه‌ویرگول انگلیسی"),
+                               "?": ("؟", "علامت سؤال انگلیسی"), "$": ("﷼", None), "%": ("٪", "درصد انگلیسی")},
+    FixOption.FIX_FAKE_HYPHENS.name: {ch: (ZWNJ, "نیم‌فاصلهٔ کاذب") for ch in
+                                      ["\u00AD", "\u00AC", "\u200F", "\u2005", "\uFEFF", "\u200B", "\u200D"]},
+}
+# نام ویرایش جایگزینی‌های بی‌شمارش در فهرست ویرایش‌ها (edits)
+UNCOUNTED_CHAR_LABELS = {"$": "نماد ریال"}
+
+# مراحلی که در ابتدای زنجیره پشت سر هم اجرا می‌شوند و مبدأ و مقصدشان هم‌پوشانی ندارد،
+# پس می‌توان آن‌ها را در یک گذر str.translate ادغام کرد. نیم‌فاصلهٔ کاذب چنین نیست:
+# مثلاً \u2005 فاصله (\s) است و مراحل فاصله‌گذاری پیش از آن باید آن را ببینند.
+FUSED_CHAR_OPTIONS = (FixOption.FIX_K_Y.name, FixOption.FIX_NUMBERS_EN.name,
+                      FixOption.FIX_NUMBERS_AR.name, FixOption.FIX_PUNCT.name)
+
+class CharTranslator:
+    """جدول ترجمهٔ ازپیش‌ساخته برای چند مرحلهٔ نویسه‌ای؛ شمارش همهٔ دسته‌ها با یک گذر
+    و جایگزینی با یک فراخوانی str.translate انجام می‌شود."""
+
+    def __init__(self, option_names):
+        mapping = {}
+        for name in option_names: mapping.update(CHAR_FIXES[name])
+        self.table = str.maketrans({src: dst for src, (dst, _) in mapping.items()})
+        self.categories = {src: category for src, (_, category) in mapping.items()}
+        self.labels = {src: category or UNCOUNTED_CHAR_LABELS[src] for src, category in self.categories.items()}
+        self.pattern = re.compile("[" + "".join(map(re.escape, mapping)) + "]")
+        self.triggers = tuple(mapping)
+
+    # record (اگر داده شود) فهرست ویرایش‌های (آغاز, پایان, جایگزین, دسته) این گذر را می‌گیرد؛ مثل همهٔ مراحل زنجیره
+    def fix(self, text, report_counts, record=None):
+        hits = self.pattern.findall(text)
+        if not hits: return text
+        for ch, n in Counter(hits).items():
+            category = self.categories[ch]
+            if category: report_counts[category] += n
+        if record is not None:
+            record([(m.start(), m.end(), self.table[ord(m.group())], self.labels[m.group()]) for m in self.pattern.finditer(text)])
+        return text.translate(self.table)
+
+_CHAR_TRANSLATORS = {}
+
+def get_char_translator(option_names):
+    option_names = tuple(option_names)
+    translator = _CHAR_TRANSLATORS.get(option_names)
+    if translator is None:
+        translator = _CHAR_TRANSLATORS[option_names] = CharTranslator(option_names)
+    return translator
+
+# ---------- الگوهای ازپیش‌کامپایل‌شده ----------
+REPEATED_QUESTION_PATTERN = re.compile(r"؟{2,}")
+REPEATED_EXCLAMATION_PATTERN = re.compile(r"!{2,}")
+HE_YE_PATTERN = re.compile(r"(\S*ه)[\s\u200c]ی\b")
+ME_NEMI_PATTERN = re.compile(r"(?<!\u200c)\b(ن?می)(?:\s+)?([\u0600-\u06FF]+)\b")
+ME_NEMI_VERB_SUFFIXES = ("م", "ی", "د", "یم", "ید", "ند")
+ME_NEMI_VERB_WORDS = frozenset(["شده", "رفت", "آمد", "خورد", "گشت", "شد"])
+VERB_PREFIXES = ["بر", "در", "فرو", "فرا", "باز", "وا", "ورا", "ور"]
+PREFIX_VERB_PATTERN = re.compile(r"\b(" + "|".join(VERB_PREFIXES) + r")\s+([آ-ی]+)")
+PREFIX_VERB_BLOCK_WORDS = frozenset(["می", "نمی", "خواهد", "باید", "که"])
+SIMPLE_VERBS = frozenset(simple_verbs)
+HA_SUFFIXES = ["ها", "های", "هایی", "هایم", "هایت", "هایش", "هایمان", "هایتان", "هایشان"]
+HA_SUFFIX_PATTERNS = [re.compile(rf"\b(\S+)\s+({suffix})\b") for suffix in HA_SUFFIXES]
+PRONOMINAL_SUFFIX_PATTERN = re.compile(r"(\S+)\s+(تر(?:ین)?|م|ت|ش|ام|ات|اش|ایم|اید|اند|مان|تان|شان)\b")
+INNER_SPACE_PATTERNS = [re.compile(pat) for pat in [
+    r"(?<=«)\s+", r"\s+(?=»)", r"(?<=\()\s+", r"\s+(?=\))", r"(?<=\[)\s+",
+    r"\s+(?=\])", r"(?<=\{)\s+", r"\s+(?=\})", r"(?<=⟨)\s+", r"\s+(?=⟩)"]]
+INNER_SPACE_MERGED_PATTERN = re.compile(r"(?<=[«(\[{⟨])\s+|\s+(?=[»)\]}⟩])")
+SPACE_BEFORE_PUNCT_PATTERN = re.compile(r"\s*([،؛:؟!.»\]\)\}])")
+SPACE_BEFORE_CLOSING_PATTERN = re.compile(r"\s+([،؛؟.\)»\]\}\⟩])")
+MULTI_SPACE_PATTERN = re.compile(r"[ ]{2,}")
+ELLIPSIS_PATTERN = re.compile(r"\.{3,}")
+
 # ---------- توابع اصلاح متن ----------
+# بازهٔ (آغاز, پایان, جایگزین, دسته) جایگزینی old با new در جای start، بی پیشوند و پسوند مشترک آن دو
+def trimmed_span(start, old, new, category):
+    head = common_affix_length(old, new)
+    tail = common_affix_length(old[head:], new[head:], from_end=True)
+    return start + head, start + len(old) - tail, new[head:len(new) - tail], category
+
+# همان pattern.subn؛ با record بازهٔ هر جایگزینی که متن را تغییر دهد (تنگ‌شده به بخش تغییرکرده) با دسته‌اش
+# به record داده می‌شود. repl رشته (با ارجاع‌هایی مثل \1) یا تابعی از تطبیق است
+def sub_recorded(pattern, repl, text, record, category):
+    if record is None: return pattern.subn(repl, text)
+    spans, pieces, pos, n = [], [], 0, 0
+    literal = None if callable(repl) or "\\" in repl else repl
+    for m in pattern.finditer(text):
+        n += 1
+        replacement = literal if literal is not None else repl(m) if callable(repl) else m.expand(repl)
+        matched = m.group()
+        if replacement == matched: continue
+        spans.append(trimmed_span(m.start(), matched, replacement, category))
+        pieces.append(text[pos:m.start()]); pieces.append(replacement); pos = m.end()
+    if not spans: return text, n
+    record(spans)
+    pieces.append(text[pos:])
+    return "".join(pieces), n
+
 def fix_k_y(text, report_counts):
     c_before = text.count("ك")
     if c_before: report_counts["کاف عربی"] += c_before; text = text.replace("ك", "ک")
@@ -250,14 +618,14 @@ def fix_k_y(text, report_counts):
     return text
 
 def fix_numbers_en_func(text, report_counts):
-    text, n = re.subn(r"[0-9]", lambda m: en_numbers_to_fa(m.group(0)), text)
+    n = sum(map(text.count, EN_DIGITS))
     report_counts["اعداد انگلیسی"] += n
-    return text
+    return en_numbers_to_fa(text) if n else text
 
 def fix_numbers_ar_func(text, report_counts):
-    text, n = re.subn(r"[٠-٩]", lambda m: ar_numbers_to_fa(m.group(0)), text)
+    n = sum(map(text.count, AR_DIGITS))
     report_counts["اعداد عربی"] += n
-    return text
+    return ar_numbers_to_fa(text) if n else text
 
 def fix_punct(text, report_counts):
     punct_map = {",":"،",";":"؛","?":"؟","$":"﷼","%":"٪"}
@@ -269,140 +637,1232 @@ def fix_punct(text, report_counts):
             elif en_punct=="?": report_counts["علامت سؤال انگلیسی"]+=n
             elif en_punct=="%": report_counts["درصد انگلیسی"]+=n
             text = text.replace(en_punct, fa_punct)
-    text, n_q = re.subn(r"؟{2,}", "؟", text); report_counts["علامت پرسش تکراری"] += n_q
-    text, n_e = re.subn(r"!{2,}", "!", text); report_counts["علامت تعجب تکراری"] += n_e
+    return fix_repeated_punct(text, report_counts)
+
+# حذف علامت پرسش و تعجب تکراری (بخش غیرنویسه‌ای fix_punct)
+def fix_repeated_punct(text, report_counts, record=None):
+    text, n_q = sub_recorded(REPEATED_QUESTION_PATTERN, "؟", text, record, "علامت پرسش تکراری"); report_counts["علامت پرسش تکراری"] += n_q
+    text, n_e = sub_recorded(REPEATED_EXCLAMATION_PATTERN, "!", text, record, "علامت تعجب تکراری"); report_counts["علامت تعجب تکراری"] += n_e
     return text
 
-def fix_quotes(text, report_counts):
-    quote_chars = ['"', "'", '“', '”', '‘', '’']
+QUOTE_CHARS = ['"', "'", '“', '”', '‘', '’']
+QUOTE_CATEGORY = "گیومهٔ انگلیسی"
+
+def fix_quotes(text, report_counts, record=None):
+    quote_chars = QUOTE_CHARS
     if not any(q in text for q in quote_chars): return text
     result, open_q, cnt = [], True, 0
     for ch in text:
         if ch in quote_chars: result.append("«" if open_q else "»"); open_q = not open_q; cnt +=1
         else: result.append(ch)
     if cnt%2==1 and result and result[-1]=="«": result[-1]="»"
-    text="".join(result); report_counts["گیومهٔ انگلیسی"] += cnt//2
+    # هر نویسه با یک نویسه عوض می‌شود (گاهی گیومهٔ باز پایانیِ خود متن هم)، پس جای هر ویرایش در متن تازه همان جای قبلی است
+    if record is not None: record([(i, i + 1, result[i], QUOTE_CATEGORY) for i, ch in enumerate(text) if result[i] != ch])
+    text="".join(result); report_counts[QUOTE_CATEGORY] += cnt//2
     return text
 
 def fix_he_ye(text, report_counts):
-    text, n = re.subn(r"(\S*ه)[\s\u200c]ی\b", lambda m: m.group(1)+"ٔ", text)
+    text, n = HE_YE_PATTERN.subn(lambda m: m.group(1)+"ٔ", text)
     report_counts["کسرهٔ اضافه"] += n
     return text
 
 def fix_me_nemi(text, report_counts):
-    VERB_SUFFIXES = ["م","ی","د","یم","ید","ند"]
-    pattern = r"(?<!\u200c)\b(ن?می)(?:\s+)?([\u0600-\u06FF]+)\b"
     def replace_func(match):
         prefix, word_part = match.group(1), match.group(2)
-        if any(word_part.endswith(s) for s in VERB_SUFFIXES) or word_part in ["شده","رفت","آمد","خورد","گشت","شد"]:
+        if word_part.endswith(ME_NEMI_VERB_SUFFIXES) or word_part in ME_NEMI_VERB_WORDS:
             report_counts["فاصلهٔ بعد از پیشوند افعال (مثل: می/نمی)"] +=1
             return prefix+ZWNJ+word_part
         return match.group(0)
-    return re.sub(pattern, replace_func, text)
+    return ME_NEMI_PATTERN.sub(replace_func, text)
 
 def fix_prefix_verbs(text, report_counts):
-    prefixes = ["بر","در","فرو","فرا","باز","وا","ورا","ور"]
-    block_words = ["می","نمی","خواهد","باید","که"]
-    pattern = r"\b(" + "|".join(prefixes) + r")\s+([آ-ی]+)"
     def repl(m):
         prefix, next_word = m.group(1), m.group(2)
-        if next_word in block_words or next_word not in simple_verbs: return m.group(0)
+        if next_word in PREFIX_VERB_BLOCK_WORDS or next_word not in SIMPLE_VERBS: return m.group(0)
         report_counts["فاصلهٔ بین اجزاء افعال پیشوندی"] +=1
         return prefix+next_word
-    return re.sub(pattern, repl, text)
+    return PREFIX_VERB_PATTERN.sub(repl, text)
 
+# نسخهٔ مرجع: یک گذر جداگانه برای هر پسوند (معیار درستی rule_ha_suffix)
 def fix_ha_suffix(text, report_counts):
-    ha_suffixes = ["ها", "های", "هایی", "هایم", "هایت", "هایش", "هایمان", "هایتان", "هایشان"]
     total_fixes = 0
-    for suffix in ha_suffixes:
-        pattern = rf"\b(\S+)\s+({suffix})\b"
-        text, num_replacements = re.subn(pattern, rf"\1{ZWNJ}\2", text)
+    for pattern in HA_SUFFIX_PATTERNS:
+        text, num_replacements = pattern.subn(rf"\1{ZWNJ}\2", text)
         total_fixes += num_replacements
     report_counts["فاصلهٔ قبل از پسوند جمع"] += total_fixes
     return text
 
 def fix_pronominal_suffixes(text, report_counts):
-    suffixes_pattern = r"(تر(?:ین)?|م|ت|ش|ام|ات|اش|ایم|اید|اند|مان|تان|شان)"
     def repl(match):
         word, suffix = match.group(1), match.group(2)
         report_counts["فاصلهٔ قبل از ضمایر ملکی (مثل: رفته ام)"] += 1
         if suffix in ["م", "ت", "ش"]: return f"{word}{suffix}"
         return f"{word}{ZWNJ}{suffix}"
-    pattern = rf"(\S+)\s+{suffixes_pattern}\b"
-    return re.sub(pattern, repl, text)
+    return PRONOMINAL_SUFFIX_PATTERN.sub(repl, text)
 
 def fix_suffixes(text, report_counts):
     text = fix_ha_suffix(text, report_counts)
     text = fix_pronominal_suffixes(text, report_counts)
     return text
 
-def fix_dict(text, report_counts):
-    if not REPLACEMENTS: return text
-    pattern = r"\b(" + "|".join(map(re.escape, REPLACEMENTS.keys())) + r")\b"
-    def replace_match(m):
-        report_counts["غلط‌های املایی (بانک)"] += 1
-        return REPLACEMENTS[m.group(0)]
-    return re.sub(pattern, replace_match, text)
+def fix_dict(text, report_counts, record=None):
+    if not get_replacements(): return text
+    spans = None if record is None else []
+    text, n = get_dict_matcher().subn(text, spans)
+    report_counts["غلط‌های املایی (بانک)"] += n
+    if spans: record([(start, end, value, "غلط‌های املایی (بانک)") for start, end, value in spans])
+    return text
 
+# نسخهٔ مرجع: یک گذر برای هر علامت (معیار درستی fix_spaces_merged)
 def fix_spaces(text, report_counts):
-    corrections = [(r"(?<=«)\s+",""), (r"\s+(?=»)", ""), (r"(?<=\()\s+",""), (r"\s+(?=\))",""), (r"(?<=\[)\s+",""), (r"\s+(?=\])",""), (r"(?<=\{)\s+",""), (r"\s+(?=\})",""), (r"(?<=⟨)\s+",""), (r"\s+(?=⟩)","")]
-    for pat, rep in corrections:
-        text, n = re.subn(pat, rep, text)
+    for pattern in INNER_SPACE_PATTERNS:
+        text, n = pattern.subn("", text)
         report_counts["فاصلهٔ داخلی علائم سجاوندی"] += n
     return text
 
-def fix_space_before_punct(text, report_counts):
+# هر رشتهٔ فاصله فقط در یکی از گذرهای fix_spaces حذف می‌شود، پس یک الگوی ترکیبی همان نتیجه و شمارش را می‌دهد
+def fix_spaces_merged(text, report_counts, record=None):
+    text, n = sub_recorded(INNER_SPACE_MERGED_PATTERN, "", text, record, "فاصلهٔ داخلی علائم سجاوندی")
+    report_counts["فاصلهٔ داخلی علائم سجاوندی"] += n
+    return text
+
+def fix_space_before_punct(text, report_counts, record=None):
     def repl(match):
         punct = match.group(1)
         if punct in "([«":
             if match.start()==0 or text[match.start()-1]==" ": return match.group(0)
             return " "+punct
         return punct
-    new_text, n = re.subn(r"\s*([،؛:؟!.»\]\)\}])", repl, text)
+    new_text, n = sub_recorded(SPACE_BEFORE_PUNCT_PATTERN, repl, text, record, "فاصلهٔ قبل از علائم سجاوندی")
     if n: report_counts["فاصلهٔ قبل از علائم سجاوندی"] += n
     return new_text
 
-def fix_extra_spaces(text, report_counts):
-    text, n1 = re.subn(r"\s+([،؛؟.\)»\]\}\⟩])", r"\1", text); report_counts["فاصلهٔ اضافه بین واژه‌ها"] += n1
-    text, n2 = re.subn(r"[ ]{2,}", " ", text); report_counts["فاصلهٔ اضافه بین واژه‌ها"] += n2
+def fix_extra_spaces(text, report_counts, record=None):
+    text, n1 = sub_recorded(SPACE_BEFORE_CLOSING_PATTERN, r"\1", text, record, "فاصلهٔ اضافه بین واژه‌ها"); report_counts["فاصلهٔ اضافه بین واژه‌ها"] += n1
+    text, n2 = sub_recorded(MULTI_SPACE_PATTERN, " ", text, record, "فاصلهٔ اضافه بین واژه‌ها"); report_counts["فاصلهٔ اضافه بین واژه‌ها"] += n2
     return text
 
-def fix_ellipsis(text, report_counts):
-    def replace_ellipsis(match):
-        report_counts["سه‌نقطهٔ تعلیق"] +=1
-        return "…"
-    return re.subn(r"\.{3,}", replace_ellipsis, text)[0]
-
-def fix_fake_hyphens_with_zwnj(text, report_counts):
-    fake_chars = ['\u00AD','\u00AC','\u200F','\u2005','\uFEFF','\u200B','\u200D']
-    total_count = 0
-    for ch in fake_chars:
-        n = text.count(ch)
-        if n: text = text.replace(ch,ZWNJ); total_count += n
-    report_counts["نیم‌فاصلهٔ کاذب"] += total_count
+def fix_ellipsis(text, report_counts, record=None):
+    text, n = sub_recorded(ELLIPSIS_PATTERN, "…", text, record, "سه‌نقطهٔ تعلیق")
+    report_counts["سه‌نقطهٔ تعلیق"] += n
     return text
 
+def fix_fake_hyphens_with_zwnj(text, report_counts, record=None):
+    return get_char_translator([FixOption.FIX_FAKE_HYPHENS.name]).fix(text, report_counts, record)
+
+# ---------- موتور قواعد واژه‌ای ----------
+# پاراگراف یک بار به رشته‌های بی‌فاصله و فاصله‌ها شکسته می‌شود: [فاصله, واژه, فاصله, ..., واژه, فاصله]
+# (فاصلهٔ دو سر می‌تواند تهی باشد). هر قاعده فقط واژه‌های نامزد را با جست‌وجوی مجموعه‌ای بررسی می‌کند
+# و همان نتیجه و شمارش تابع مرجعش را می‌دهد؛ متن فقط یک بار در پایان سرهم می‌شود.
+TOKEN_SPLIT_PATTERN = re.compile(r"(\S+)")
+WORD_RUN_PATTERN = re.compile(r"\w+")
+WORD_CHAR_PATTERN = re.compile(r"\w")
+ARABIC_BLOCK_RUN_PATTERN = re.compile(r"[؀-ۿ]+")
+PERSIAN_LETTER_RUN_PATTERN = re.compile(r"[آ-ی]+")
+HE_YE_INNER = "ه" + ZWNJ + "ی"
+VERB_PREFIX_SET = frozenset(VERB_PREFIXES)
+VERB_PREFIX_ENDINGS = frozenset(prefix[-2:] for prefix in VERB_PREFIXES)
+HA_SUFFIX_SET = frozenset(HA_SUFFIXES)
+PRONOMINAL_SUFFIX_SET = frozenset(["تر", "ترین", "م", "ت", "ش", "ام", "ات", "اش", "ایم", "اید", "اند", "مان", "تان", "شان"])
+PRONOMINAL_SUFFIX_HEADS = frozenset(suffix[0] for suffix in PRONOMINAL_SUFFIX_SET)
+PRONOMINAL_JOINED_SUFFIXES = frozenset(["م", "ت", "ش"])
+
+def leading_word(token):
+    m = WORD_RUN_PATTERN.match(token)
+    return m.group() if m else ""
+
+# بلندترین پیشوند run (از start تا end) که به مرز واژه ختم شود؛ معادل عقب‌گرد «+…\b» در re
+def boundary_prefix_end(token, start, end):
+    for pos in range(end, start, -1):
+        if is_word_boundary(token, pos): return pos
+    return -1
+
+# step(tokens, i, state) برای واژهٔ i یک سه‌تایی (متن تازه, پیوند با واژهٔ بعدی یا None, state) می‌دهد.
+# state غیر None یعنی تطبیق الگوی مرجع تا درون واژهٔ i+2 رفته و آن واژه هم باید با همین state بررسی شود؛
+# پیوند جای فاصلهٔ میان دو واژه را می‌گیرد و آن دو را یکی می‌کند. با record بازهٔ هر واژهٔ تغییرکرده
+# (تنگ‌شده به بخش تغییرکرده) و هر پیوند با دستهٔ category بر حسب متن ورودی این قاعده گزارش می‌شود.
+def apply_token_rule(tokens, candidates, step, record=None, category=None):
+    edits, last = {}, -1
+    for i in candidates:
+        if i <= last: continue
+        state, merging = None, False
+        while True:
+            text, joint, state = step(tokens, i, state)
+            if merging or joint is not None or text is not tokens[i]: edits[i] = (text, joint)
+            last, merging = i, joint is not None
+            if state is None: break
+            i += 2
+    if not edits: return tokens
+    if record is not None: record_token_edits(tokens, edits, record, category)
+    out, last, joint = [], 0, None
+    for i, (text, next_joint) in edits.items():
+        if joint is None: out.extend(tokens[last:i]); out.append(text)
+        else: out[-1] += joint + text
+        joint, last = next_joint, i + 1
+    out.extend(tokens[last:])
+    return out
+
+def record_token_edits(tokens, edits, record, category):
+    starts = list(accumulate(map(len, tokens), initial=0))
+    spans = []
+    for i, (text, joint) in edits.items():
+        if text != tokens[i]: spans.append(trimmed_span(starts[i], tokens[i], text, category))
+        if joint is not None: spans.append((starts[i+1], starts[i+2], joint, category))
+    record(spans)
+
+def rule_he_ye(tokens, report_counts, record=None):
+    size, count = len(tokens), [0]
+    candidates = [i for i in range(1, size, 2) if tokens[i][-1] == "ه" or HE_YE_INNER in tokens[i]]
+    if not candidates: return tokens
+    # state=1: «ی» ابتدای این واژه در تطبیق قبلی مصرف شده است
+    def step(tokens, i, state):
+        token, offset = tokens[i], 1 if state else 0
+        # \S* حریص است: آخرین «ه» ممکن برنده است و «ه + فاصله + ی» در انتهای واژه از همه آخرتر است
+        if (len(token) > offset and token[-1] == "ه" and i + 2 < size and len(tokens[i+1]) == 1
+                and leading_word(tokens[i+2]) == "ی"):
+            count[0] += 1
+            return token[offset:] if offset else token, "ٔ", 1
+        pos = token.rfind(HE_YE_INNER, offset)
+        while pos >= 0 and not is_word_boundary(token, pos + 3):
+            pos = token.rfind(HE_YE_INNER, offset, pos)
+        if pos >= 0:
+            count[0] += 1
+            token = token[:pos+1] + "ٔ" + token[pos+3:]
+        return token[offset:] if offset else token, None, None
+    tokens = apply_token_rule(tokens, candidates, step, record, "کسرهٔ اضافه")
+    report_counts["کسرهٔ اضافه"] += count[0]
+    return tokens
+
+# نخستین شروع ممکنِ «(ن?می)» در واژه از offset به بعد: (آغاز, طول پیشوند)
+def find_me_nemi_prefix(token, offset):
+    pos = token.find("می", offset)
+    while pos >= 0:
+        if pos > offset and token[pos-1] == "ن":
+            start, length = pos - 1, 3
+        else:
+            start, length = pos, 2
+        if start >= offset and (start == 0 or (token[start-1] != ZWNJ and not is_word_char(token[start-1]))):
+            return start, length
+        pos = token.find("می", pos + 1)
+    return -1, 0
+
+def is_me_nemi_verb(word_part):
+    return word_part.endswith(ME_NEMI_VERB_SUFFIXES) or word_part in ME_NEMI_VERB_WORDS
+
+def rule_me_nemi(tokens, report_counts, record=None):
+    size, count = len(tokens), [0]
+    candidates = [i for i in range(1, size, 2) if "می" in tokens[i]]
+    if not candidates: return tokens
+    # state: جای پایان تطبیق قبلی در این واژه
+    def step(tokens, i, state):
+        token, offset = tokens[i], state or 0
+        while True:
+            start, length = find_me_nemi_prefix(token, offset)
+            if start < 0: return token, None, None
+            word_start = start + length
+            if word_start < len(token):
+                run = ARABIC_BLOCK_RUN_PATTERN.match(token, word_start)
+                end = boundary_prefix_end(token, word_start, run.end()) if run else -1
+                if end < 0: offset = start + 1; continue
+                if is_me_nemi_verb(token[word_start:end]):
+                    count[0] += 1
+                    token = token[:word_start] + ZWNJ + token[word_start:]
+                    end += 1
+                offset = end
+                continue
+            # پیشوند در انتهای واژه: بخش دوم فعل، واژهٔ بعد از فاصله است
+            if i + 2 >= size: return token, None, None
+            following = tokens[i+2]
+            run = ARABIC_BLOCK_RUN_PATTERN.match(following)
+            end = boundary_prefix_end(following, 0, run.end()) if run else -1
+            if end < 0: offset = start + 1; continue
+            if is_me_nemi_verb(following[:end]):
+                count[0] += 1
+                return token, ZWNJ, end
+            return token, None, end
+    tokens = apply_token_rule(tokens, candidates, step, record, "فاصلهٔ بعد از پیشوند افعال (مثل: می/نمی)")
+    report_counts["فاصلهٔ بعد از پیشوند افعال (مثل: می/نمی)"] += count[0]
+    return tokens
+
+def rule_prefix_verbs(tokens, report_counts, record=None):
+    size, count = len(tokens), [0]
+    candidates = [i for i in range(1, size - 2, 2) if tokens[i][-2:] in VERB_PREFIX_ENDINGS]
+    if not candidates: return tokens
+    # state: طول بخش مصرف‌شدهٔ این واژه در تطبیق قبلی
+    def step(tokens, i, state):
+        token, offset = tokens[i], state or 0
+        if i + 2 >= size: return token, None, None
+        # پیشوند باید کل رشتهٔ واژه‌ایِ پایانی باشد و بعد از تطبیق قبلی شروع شود
+        for length in (2, 3):
+            start = len(token) - length
+            if (start >= offset and token[start:] in VERB_PREFIX_SET
+                    and (start == 0 or not is_word_char(token[start-1]))): break
+        else: return token, None, None
+        run = PERSIAN_LETTER_RUN_PATTERN.match(tokens[i+2])
+        if not run: return token, None, None
+        next_word = run.group()
+        if next_word in PREFIX_VERB_BLOCK_WORDS or next_word not in SIMPLE_VERBS:
+            return token, None, len(next_word)
+        count[0] += 1
+        return token, "", len(next_word)
+    tokens = apply_token_rule(tokens, candidates, step, record, "فاصلهٔ بین اجزاء افعال پیشوندی")
+    report_counts["فاصلهٔ بین اجزاء افعال پیشوندی"] += count[0]
+    return tokens
+
+# همان نتیجهٔ fix_ha_suffix با یک گذر. در اجرای چندگذره، اگر واژهٔ قبلی در گذرِ همین پسوند
+# به پسوندش چسبیده باشد و آن واژه دقیقاً خودِ پسوند باشد، تطبیق بعدی در همان گذر از دست می‌رود.
+def rule_ha_suffix(tokens, report_counts, record=None):
+    size, count = len(tokens), [0]
+    candidates = [i for i in range(1, size - 2, 2) if tokens[i+2].startswith("ها")]
+    if not candidates: return tokens
+    # state: پسوندی که کل این واژه بوده و به واژهٔ قبلی چسبیده (یا "")
+    def step(tokens, i, state):
+        token = tokens[i]
+        if i + 2 >= size: return token, None, None
+        following = tokens[i+2]
+        suffix = leading_word(following) if following.startswith("ها") else ""
+        if suffix not in HA_SUFFIX_SET or suffix == state or not WORD_CHAR_PATTERN.search(token):
+            return token, None, None
+        count[0] += 1
+        return token, ZWNJ, suffix if following == suffix else ""
+    tokens = apply_token_rule(tokens, candidates, step, record, "فاصلهٔ قبل از پسوند جمع")
+    report_counts["فاصلهٔ قبل از پسوند جمع"] += count[0]
+    return tokens
+
+def rule_pronominal_suffixes(tokens, report_counts, record=None):
+    size, count = len(tokens), [0]
+    candidates = [i for i in range(1, size - 2, 2) if tokens[i+2][0] in PRONOMINAL_SUFFIX_HEADS]
+    if not candidates: return tokens
+    # state: طول پسوندی از ابتدای این واژه که در تطبیق قبلی مصرف شده است
+    def step(tokens, i, state):
+        token, offset = tokens[i], state or 0
+        if i + 2 >= size or offset >= len(token): return token, None, None
+        suffix = leading_word(tokens[i+2])
+        if suffix not in PRONOMINAL_SUFFIX_SET: return token, None, None
+        count[0] += 1
+        return token, "" if suffix in PRONOMINAL_JOINED_SUFFIXES else ZWNJ, len(suffix)
+    tokens = apply_token_rule(tokens, candidates, step, record, "فاصلهٔ قبل از ضمایر ملکی (مثل: رفته ام)")
+    report_counts["فاصلهٔ قبل از ضمایر ملکی (مثل: رفته ام)"] += count[0]
+    return tokens
+
+# گزینه ← قاعده(ها)ی واژه‌ای، به همان ترتیب توابع مرجع در زنجیره
+WORD_RULES = [
+    (FixOption.FIX_HE_YE.name, (rule_he_ye,)),
+    (FixOption.FIX_ME_NEMI.name, (rule_me_nemi,)),
+    (FixOption.FIX_PREFIX_VERBS.name, (rule_prefix_verbs,)),
+    (FixOption.FIX_SUFFIXES.name, (rule_ha_suffix, rule_pronominal_suffixes)),
+]
+
+# گروه جایگزین‌های یک عبارت منظم، بلندترها اول
+def alternatives(words):
+    return "(?:" + "|".join(sorted(words, key=len, reverse=True)) + ")"
+
+# شرط لازم هر قاعده برای تغییر متن: جای نیم‌فاصله یا پیوند ممکن (فاصله پیش از پسوند، پس از پیشوند، «ه ی»).
+# متنی که هیچ‌کدام را ندارد (مثلاً پاراگراف ازپیش‌اصلاح‌شده) بی‌شکستن به واژه‌ها از این مرحله می‌گذرد.
+WORD_RULE_TRIGGERS = {
+    rule_he_ye: r"ه[\s\u200c]ی(?!\w)",
+    rule_me_nemi: r"می\s*[؀-ۿ]",
+    rule_prefix_verbs: alternatives(VERB_PREFIXES) + r"\s+" + alternatives(SIMPLE_VERBS - PREFIX_VERB_BLOCK_WORDS) + "(?![آ-ی])",
+    rule_ha_suffix: r"\s" + alternatives(HA_SUFFIX_SET) + r"(?!\w)",
+    rule_pronominal_suffixes: r"\s" + alternatives(PRONOMINAL_SUFFIX_SET) + r"(?!\w)",
+}
+
+class WordRuleEngine:
+    """قواعد واژه‌ای فعال روی یک بار شکستن پاراگراف؛ متن فقط یک بار در پایان دوباره سرهم می‌شود."""
+
+    def __init__(self, option_names):
+        self.option_names = tuple(option_names)
+        self.rules = [rule for name, rules in WORD_RULES if name in self.option_names for rule in rules]
+        self.triggers = re.compile("|".join(WORD_RULE_TRIGGERS[rule] for rule in self.rules))
+
+    # با record ویرایش‌های هر قاعده جداگانه و بر حسب خروجی قاعدهٔ پیشین گزارش می‌شوند
+    def fix(self, text, report_counts, record=None):
+        tokens = TOKEN_SPLIT_PATTERN.split(text)
+        if len(tokens) < 2: return text
+        original = tokens
+        for rule in self.rules:
+            tokens = rule(tokens, report_counts) if record is None else rule(tokens, report_counts, record)
+        return text if tokens is original else "".join(tokens)
+
+# ---------- پیش‌پویش ----------
+# نویسه‌ها یا رشته‌هایی که بدون هیچ‌کدامشان مرحلهٔ هم‌نام نه متن را تغییر می‌دهد و نه شمارشی را.
+# مراحل نویسه‌ای ادغام‌شده نشانه‌هایشان را از جدول CharTranslator می‌گیرند و قواعد واژه‌ای الگوی
+# WORD_RULE_TRIGGERS را؛ بانک غلط‌ها نشانه ندارد و همیشه اجرا می‌شود.
+STAGE_TRIGGERS = {
+    FixOption.FIX_PUNCT.name: ("؟؟", "!!"),
+    FixOption.FIX_QUOTES.name: ('"', "'", '“', '”', '‘', '’'),
+    FixOption.FIX_SPACES.name: tuple("«([{⟨»)]}⟩"),
+    FixOption.FIX_SPACE_BEFORE_PUNCT.name: tuple("،؛:؟!.»])}"),
+    FixOption.FIX_EXTRA_SPACES.name: tuple("،؛؟.)»]}⟩") + ("  ",),
+    FixOption.FIX_ELLIPSIS.name: ("...",),
+    FixOption.FIX_FAKE_HYPHENS.name: tuple(CHAR_FIXES[FixOption.FIX_FAKE_HYPHENS.name]),
+}
+
+# ---------- زنجیرهٔ اصلاح ----------
+class FixPipeline:
+    """مراحل فعال برای یک مجموعه تنظیمات (خروجی load_config) که یک بار ساخته می‌شود و
+    برای همهٔ پاراگراف‌های سند دوباره به کار می‌رود. هر مرحله یک سه‌تایی (نام گزینه, تابع, نشانه‌ها) است
+    و فقط وقتی اجرا می‌شود که پیش‌پویش پاراگراف یکی از نشانه‌هایش را پیدا کرده باشد؛ نشانه‌ها فهرست رشته‌ها
+    یا یک الگوی کامپایل‌شده (قواعد واژه‌ای) است.
+    تابع هر مرحله (متن, شمارش‌ها, record=None) است؛ با record بازه‌های تک‌تک تطبیق‌هایش را هم گزارش می‌کند."""
+
+    def __init__(self, options):
+        self.options = {option.name: options.get(option.name, True) for option in FixOption}
+        enabled = lambda option: self.options[option.name]
+        stages = []
+        chars = [name for name in FUSED_CHAR_OPTIONS if self.options[name]]
+        if chars:
+            translator = get_char_translator(chars)
+            stages.append(("+".join(chars), translator.fix, translator.triggers))
+        add = lambda option, func: stages.append((option.name, func, STAGE_TRIGGERS.get(option.name)))
+        if enabled(FixOption.FIX_PUNCT): add(FixOption.FIX_PUNCT, fix_repeated_punct)
+        if enabled(FixOption.FIX_QUOTES): add(FixOption.FIX_QUOTES, fix_quotes)
+        words = [name for name, _ in WORD_RULES if self.options[name]]
+        if words:
+            engine = WordRuleEngine(words)
+            stages.append(("+".join(words), engine.fix, engine.triggers))
+        if enabled(FixOption.FIX_DICT): add(FixOption.FIX_DICT, fix_dict)
+        if enabled(FixOption.FIX_SPACES): add(FixOption.FIX_SPACES, fix_spaces_merged)
+        if enabled(FixOption.FIX_SPACE_BEFORE_PUNCT): add(FixOption.FIX_SPACE_BEFORE_PUNCT, fix_space_before_punct)
+        if enabled(FixOption.FIX_EXTRA_SPACES): add(FixOption.FIX_EXTRA_SPACES, fix_extra_spaces)
+        if enabled(FixOption.FIX_ELLIPSIS): add(FixOption.FIX_ELLIPSIS, fix_ellipsis)
+        if enabled(FixOption.FIX_FAKE_HYPHENS): add(FixOption.FIX_FAKE_HYPHENS, fix_fake_hyphens_with_zwnj)
+        self.stages = stages
+        # هر نویسهٔ نشانه بیت مراحلی را دارد که با آن اجرا می‌شوند؛ نشانهٔ چندنویسه‌ای (مثل «...») فقط وقتی
+        # جست‌وجو می‌شود که نویسهٔ اولش در متن باشد. مرحلهٔ دارای الگو بیت ندارد و با search بررسی می‌شود
+        self.stage_bits, self.trigger_bits, self.trigger_strings = [], {}, []
+        for index, (_, _, triggers) in enumerate(stages):
+            bit = 1 << index if triggers is not None and not hasattr(triggers, "search") else 0
+            self.stage_bits.append(bit)
+            for trigger in triggers if bit else ():
+                self.trigger_bits[trigger[0]] = self.trigger_bits.get(trigger[0], 0) | (bit if len(trigger) == 1 else 0)
+                if len(trigger) > 1: self.trigger_strings.append((trigger, bit))
+        self.trigger_class = re.compile("[" + re.escape("".join(sorted(self.trigger_bits))) + "]" if self.trigger_bits else "(?!)")
+        self.key = options_key(self.options)
+
+    # یک پویش برای همهٔ نشانه‌های نویسه‌ای مراحل این زنجیره؛ خروجی بیت‌های مراحلی که باید اجرا شوند
+    def prescan(self, text):
+        found, mask = set(self.trigger_class.findall(text)), 0
+        for ch in found: mask |= self.trigger_bits[ch]
+        for trigger, bit in self.trigger_strings:
+            if not mask & bit and trigger[0] in found and trigger in text: mask |= bit
+        return mask
+
+    # با metrics (یک PipelineMetrics) زمان و کار هر مرحله هم ثبت می‌شود.
+    # record به هر مرحله داده می‌شود و فهرست ویرایش‌های هر گذر را بر حسب متن ورودی همان گذر می‌گیرد
+    def run(self, text, report_counts, metrics=None, record=None):
+        present = self.prescan(text)
+        for (name, stage, triggers), bit in zip(self.stages, self.stage_bits):
+            if triggers is not None:
+                if not bit: found = triggers.search(text)
+                elif present is None: found = any(trigger in text for trigger in triggers)
+                else: found = present & bit
+                if not found:
+                    if metrics is not None: metrics.skip(name)
+                    continue
+            if metrics is not None: fixed = metrics.measure(name, stage, text, report_counts, record)
+            elif record is None: fixed = stage(text, report_counts)
+            else: fixed = stage(text, report_counts, record)
+            # متن تغییرکرده ممکن است نشانهٔ مرحلهٔ بعدی را ساخته باشد؛ از اینجا هر مرحله نشانه‌های خودش را می‌پوید
+            if fixed != text: text, present = fixed, None
+        return text
+
+    # متن اصلاح‌شده و فهرست ویرایش‌های (آغاز, طول, جایگزین, دسته) بر حسب متن ورودی. هر مرحله بازه‌های تطبیق‌هایش را
+    # با دستهٔ همان تطبیق می‌دهد و EditComposer آن‌ها را به مختصات متن ورودی برمی‌گرداند؛ متن‌ها با هم مقایسه نمی‌شوند
+    def edits(self, text, report_counts, metrics=None):
+        composer = EditComposer(text)
+        return self.run(text, report_counts, metrics, composer.apply), composer.edits()
+
+_PIPELINES = {}
+
+# کلید یکتای مجموعه گزینه‌های فعال
+def options_key(options):
+    return tuple(option.name for option in FixOption if options.get(option.name, True))
+
+# زنجیرهٔ کامپایل‌شده برای هر مجموعه تنظیمات فقط یک بار ساخته می‌شود
+def get_pipeline(options):
+    key = options_key(options)
+    pipeline = _PIPELINES.get(key)
+    if pipeline is None:
+        pipeline = _PIPELINES[key] = FixPipeline(options)
+    return pipeline
+
 def fix_all(text, options, report_counts):
-    pipeline = []
-    if options.get(FixOption.FIX_K_Y.name, True): pipeline.append(fix_k_y)
-    if options.get(FixOption.FIX_NUMBERS_EN.name, True): pipeline.append(fix_numbers_en_func)
-    if options.get(FixOption.FIX_NUMBERS_AR.name, True): pipeline.append(fix_numbers_ar_func)
-    if options.get(FixOption.FIX_PUNCT.name, True): pipeline.append(fix_punct)
-    if options.get(FixOption.FIX_QUOTES.name, True): pipeline.append(fix_quotes)
-    if options.get(FixOption.FIX_HE_YE.name, True): pipeline.append(fix_he_ye)
-    if options.get(FixOption.FIX_ME_NEMI.name, True): pipeline.append(fix_me_nemi)
-    if options.get(FixOption.FIX_PREFIX_VERBS.name, True): pipeline.append(fix_prefix_verbs)
-    if options.get(FixOption.FIX_SUFFIXES.name, True): pipeline.append(fix_suffixes)
-    if options.get(FixOption.FIX_DICT.name, True): pipeline.append(fix_dict)
-    if options.get(FixOption.FIX_SPACES.name, True): pipeline.append(fix_spaces)
-    if options.get(FixOption.FIX_SPACE_BEFORE_PUNCT.name, True): pipeline.append(fix_space_before_punct)
-    if options.get(FixOption.FIX_EXTRA_SPACES.name, True): pipeline.append(fix_extra_spaces)
-    if options.get(FixOption.FIX_ELLIPSIS.name, True): pipeline.append(fix_ellipsis)
-    if options.get(FixOption.FIX_FAKE_HYPHENS.name, True): pipeline.append(fix_fake_hyphens_with_zwnj)
-    
-    for func in pipeline:
-        text = func(text, report_counts)
-    return text
+    return get_pipeline(options).run(text, report_counts)
+
+# ---------- ویرایش‌های بازه‌ای ----------
+# طول بلندترین پیشوند (یا با from_end پسوند) مشترک دو متن؛ جست‌وجوی دودویی با مقایسهٔ برش‌ها
+def common_affix_length(a, b, from_end=False):
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if (a[len(a) - mid:] == b[len(b) - mid:]) if from_end else (a[:mid] == b[:mid]): low = mid
+        else: high = mid - 1
+    return low
+
+class EditComposer:
+    """ترکیب ویرایش‌های مراحل پیاپی: متن کنونی فهرستی از تکه‌هاست که یا برشی از متن اصلی‌اند
+    (متن None) یا جایگزین یک بازهٔ متن اصلی؛ ویرایش تازه بر حسب متن کنونی روی این تکه‌ها نشانده می‌شود."""
+
+    def __init__(self, text):
+        self.original = text
+        self.segments = [(0, len(text), None, ())] if text else []   # (آغاز, پایان در متن اصلی, متن جایگزین, دسته‌ها)
+
+    def _current(self, segment):
+        start, end, text, _ = segment
+        return self.original[start:end] if text is None else text
+
+    # جایگزینی بازهٔ [start, end) متن کنونی؛ تکهٔ جایگزین نیمه‌پوشیده یک‌جا در ویرایش تازه ادغام می‌شود.
+    # پویش از تکهٔ first که در جای pos متن کنونی آغاز می‌شود شروع شده و با نخستین تکهٔ پس از بازه می‌ایستد
+    def replace(self, start, end, replacement, categories, first=0, pos=0):
+        segments, covered, last = self.segments, [], first
+        for index in range(first, len(segments)):
+            segment = segments[index]
+            length = len(self._current(segment))
+            seg_start, seg_end, pos = pos, pos + length, pos + length
+            if seg_end < start or (seg_end == start and (start < end or length or segment[2] is None)): last = index + 1
+            elif seg_start > end or (seg_start == end and start < end): break
+            else: covered.append((segment, seg_start))
+        pieces, cats, head, tail = [], [], [], []
+        orig_start = orig_end = None
+        for segment, seg_start in covered:
+            o_start, o_end, text, seg_cats = segment
+            current = self._current(segment)
+            cut_from, cut_to = max(start - seg_start, 0), min(end - seg_start, len(current))
+            if text is None:
+                # برش اصلی در مرز ویرایش شکسته می‌شود و بخش بیرونی برش اصلی می‌ماند
+                if cut_from: head.append((o_start, o_start + cut_from, None, ()))
+                if cut_to < len(current): tail.append((o_start + cut_to, o_end, None, ()))
+                o_start, o_end, current = o_start + cut_from, o_start + cut_to, current[cut_from:cut_to]
+                cut_from, cut_to = 0, len(current)
+            else: cats.extend(seg_cats)
+            if orig_start is None: orig_start = o_start
+            orig_end = o_end
+            pieces.append((current, cut_from, cut_to))
+        if orig_start is None:
+            # درج در مرز دو تکه
+            orig_start = orig_end = segments[last - 1][1] if last else 0
+            pieces = [("", 0, 0)]
+        text = pieces[0][0][:pieces[0][1]] + replacement + pieces[-1][0][pieces[-1][2]:]
+        for category in categories:
+            if category not in cats: cats.append(category)
+        segments[last:last + len(covered)] = head + [(orig_start, orig_end, text, tuple(cats))] + tail
+
+    # ویرایش‌های یک گذر: (آغاز, پایان, جایگزین, دسته) بر حسب متن کنونی، به ترتیب و بی‌هم‌پوشانی.
+    # از آخر به اول نشانده می‌شوند، پس تکه‌های پیش از هر بازه هنوز دست‌نخورده‌اند و جای آغازشان
+    # از یک جمع پیشوندی پیش از گذر با جست‌وجوی دودویی پیدا می‌شود
+    def apply(self, spans):
+        starts = list(accumulate((len(self._current(segment)) for segment in self.segments), initial=0))
+        for start, end, replacement, category in reversed(spans):
+            first = max(bisect_left(starts, start, 0, len(starts) - 1) - 1, 0)
+            self.replace(start, end, replacement, (category,), first, starts[first])
+
+    # ویرایش‌های نهایی (آغاز, طول, جایگزین, دسته) بر حسب متن اصلی؛ تکه‌های جایگزین پیاپی با دسته‌های یکسان
+    # (مثلاً رقم‌های یک عدد) یکی می‌شوند و تطبیق‌های کنار هم از دسته‌های دیگر ویرایش‌های جدا می‌مانند
+    def edits(self):
+        edits, group = [], None
+        for segment in self.segments + [None]:
+            if group is not None and (segment is None or segment[2] is None or segment[3] != group[3]):
+                start, end, replacement = group[0], group[1], "".join(group[2])
+                if replacement != self.original[start:end]: edits.append((start, end - start, replacement, " + ".join(group[3])))
+                group = None
+            if segment is not None and segment[2] is not None:
+                if group is None: group = [segment[0], segment[1], [segment[2]], segment[3]]
+                else: group[1] = segment[1]; group[2].append(segment[2])
+        return edits
+
+# اعمال ویرایش‌های (آغاز, طول, جایگزین, دسته) روی متن اصلی
+def apply_edits(text, edits):
+    pieces, pos = [], 0
+    for start, length, replacement, _ in edits:
+        pieces.append(text[pos:start]); pieces.append(replacement); pos = start + length
+    pieces.append(text[pos:])
+    return "".join(pieces)
+
+PREVIEW_VISIBLE = str.maketrans({" ": "␣", "\u200c": "‹نیم‌فاصله›", "\t": "⇥", "\u00a0": "⍽"})
+
+class PreviewPipeline:
+    """پیش‌نمایش بی‌نوشتن: به جای اصلاح، ویرایش‌های هر پاراگراف را گرد می‌آورد و متن را دست‌نخورده برمی‌گرداند.
+    entries فهرست (شمارهٔ پاراگراف از ۱, آغاز, متن قدیم, متن تازه, دسته) است."""
+
+    def __init__(self, pipeline, metrics=None):
+        self.pipeline, self.metrics, self.key = pipeline, metrics, pipeline.key
+        self.entries, self.paragraphs = [], 0
+
+    def run(self, text, report_counts):
+        self.paragraphs += 1
+        if text:
+            _, edits = self.pipeline.edits(text, report_counts, self.metrics)
+            self.entries.extend((self.paragraphs, start, text[start:start + length], replacement, category)
+                                for start, length, replacement, category in edits)
+        return text
+
+    # fix_many با شماره‌گذاری همهٔ پاراگراف‌ها (خالی‌ها هم)، تا شماره با سطر فایل متنی یکی باشد؛
+    # با edits خروجی (متن, ویرایش‌های خالی) است، مثل fix_paragraphs
+    def fix_many(self, texts, report_counts, edits=False):
+        return [(self.run(text, report_counts), []) if edits else self.run(text, report_counts) for text in texts]
+
+# یک سطر پیش‌نمایش: «پاراگراف:ستون: دسته: «قدیم» → «تازه»» با فاصله‌ها و نیم‌فاصله‌های دیدنی
+def format_preview_entry(entry):
+    paragraph, start, old_text, new_text, category = entry
+    return f"{paragraph}:{start + 1}: {category}: «{old_text.translate(PREVIEW_VISIBLE)}» → «{new_text.translate(PREVIEW_VISIBLE)}»"
+
+# ---------- سنجش مراحل ----------
+class PipelineMetrics:
+    """زمان، تعداد فراخوانی و ردشدن، نویسه‌های ورودی و اصلاحات هر مرحلهٔ زنجیره (با نام گزینه؛
+    مراحل ادغام‌شده با نام‌های پیوسته با +) و زمان رفت‌وبرگشت‌های UNO. to_dict برای JSON است."""
+
+    def __init__(self):
+        self.stages, self.uno = {}, {}
+        self.paragraphs = self.cache_hits = self.cache_misses = 0
+        self.interactive_seconds = 0.0   # زمان تا پاسخ‌گو شدن دوبارهٔ لیبره‌آفیس (برای اجرای پس‌زمینه کمتر از seconds)
+        self.started = time.perf_counter()
+
+    def _stage(self, name):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {"calls": 0, "skipped": 0, "seconds": 0.0, "chars": 0, "matches": 0}
+        return entry
+
+    def measure(self, name, stage, text, report_counts, record=None):
+        before = sum(report_counts.values())
+        start = time.perf_counter()
+        fixed = stage(text, report_counts) if record is None else stage(text, report_counts, record)
+        entry = self._stage(name)
+        entry["seconds"] += time.perf_counter() - start
+        entry["calls"] += 1
+        entry["chars"] += len(text)
+        entry["matches"] += sum(report_counts.values()) - before
+        return fixed
+
+    def skip(self, name):
+        self._stage(name)["skipped"] += 1
+
+    # یک فراخوانی UNO (read، write یا move) همراه با زمانش
+    def uno_call(self, kind, func, *args):
+        start = time.perf_counter()
+        try: return func(*args)
+        finally:
+            entry = self.uno.get(kind)
+            if entry is None: entry = self.uno[kind] = {"calls": 0, "seconds": 0.0}
+            entry["calls"] += 1
+            entry["seconds"] += time.perf_counter() - start
+
+    # شمارش برخورد/ازدست‌رفتن حافظهٔ نهان از یک CachedPipeline (از مقدارهای hits/misses پیشین به بعد)
+    def add_cache(self, pipeline, hits=0, misses=0):
+        self.cache_hits += pipeline.hits - hits
+        self.cache_misses += pipeline.misses - misses
+
+    # افزودن خروجی to_dict سنجشی دیگر (مثلاً از پردازهٔ کمکی)
+    def merge(self, data):
+        self.paragraphs += data["paragraphs"]
+        self.cache_hits += data["cache"]["hits"]; self.cache_misses += data["cache"]["misses"]
+        merge_metrics(self.stages, data["stages"]); merge_metrics(self.uno, data["uno"])
+
+    def to_dict(self):
+        return {"seconds": time.perf_counter() - self.started, "interactive_seconds": self.interactive_seconds,
+                "paragraphs": self.paragraphs,
+                "cache": {"hits": self.cache_hits, "misses": self.cache_misses},
+                "stages": self.stages, "uno": self.uno}
+
+# جمع کردن خروجی to_dict چند اجرا (مثلاً پردازه‌های حالت گروهی)
+def merge_metrics(total, metrics):
+    for k, v in metrics.items():
+        if isinstance(v, dict): merge_metrics(total.setdefault(k, {}), v)
+        else: total[k] = total.get(k, 0) + v
+    return total
+
+class MeasuredPipeline:
+    """همان رابط FixPipeline که هر پاراگراف را با ثبت کار مراحل در metrics اجرا می‌کند."""
+
+    def __init__(self, pipeline, metrics):
+        self.pipeline, self.metrics = pipeline, metrics
+        self.key, self.stages = pipeline.key, pipeline.stages
+
+    def run(self, text, report_counts):
+        self.metrics.paragraphs += 1
+        return self.pipeline.run(text, report_counts, self.metrics)
+
+    def edits(self, text, report_counts):
+        self.metrics.paragraphs += 1
+        return self.pipeline.edits(text, report_counts, self.metrics)
+
+# ---------- حافظهٔ نهان نتیجهٔ پاراگراف‌ها ----------
+CACHE_MAX_BYTES = 64 << 20
+CACHE_MEMORY_ENTRIES = 20000
+CACHE_FLUSH_ENTRIES = 1000
+CACHE_SCHEMA = 2             # با تغییر ستون‌های پایگاه بالا می‌رود؛ پایگاه قالب دیگر از نو ساخته می‌شود
+
+_SOURCE_VERSION = None
+_REPLACEMENTS_VERSION = (None, "")
+
+# نسخهٔ کد؛ هر تغییری در این فایل نتیجه‌های ذخیره‌شدهٔ قبلی را بی‌اعتبار می‌کند
+def source_version():
+    global _SOURCE_VERSION
+    if _SOURCE_VERSION is None:
+        try:
+            with open(__file__, "rb") as f: _SOURCE_VERSION = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+        except (NameError, OSError): _SOURCE_VERSION = "0"
+    return _SOURCE_VERSION
+
+# نسخهٔ بانک واژه‌ها بر اساس محتوای آن؛ برای هر بانک بارگذاری‌شده فقط یک بار حساب می‌شود
+def replacements_version():
+    global _REPLACEMENTS_VERSION
+    replacements = get_replacements()
+    if _REPLACEMENTS_VERSION[0] is not replacements:
+        version = getattr(replacements, "version", None)
+        if version is None:
+            data = json.dumps(sorted(replacements.items()), ensure_ascii=False).encode("utf-8")
+            version = hashlib.blake2b(data, digest_size=8).hexdigest()
+        _REPLACEMENTS_VERSION = (replacements, version)
+    return _REPLACEMENTS_VERSION[1]
+
+class ParagraphCache:
+    """حافظهٔ نهان دولایه برای نتیجهٔ پاراگراف‌ها: LRU در حافظه و پایگاه sqlite روی دیسک که با گذشتن
+    از max_bytes کم‌استفاده‌ترین رکوردهایش حذف می‌شود. کلیدها چکیدهٔ متن و فضای نام زنجیره‌اند.
+    هر رکورد (متن اصلاح‌شده, شمارش‌ها, ویرایش‌ها) است؛ ویرایش‌های پاراگرافی که فقط با run اصلاح شده None است."""
+
+    def __init__(self, path=None, max_bytes=CACHE_MAX_BYTES, memory_entries=CACHE_MEMORY_ENTRIES):
+        self.path, self.max_bytes, self.memory_entries = path, max_bytes, memory_entries
+        self.memory, self.db = OrderedDict(), None
+        self._pending, self._touched = {}, set()
+        if path and sqlite3 is not None:
+            try: self.db = self._open(path)
+            except (OSError, sqlite3.Error) as e: log_error("ParagraphCache", e)
+
+    @staticmethod
+    def _open(path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = sqlite3.connect(path, timeout=30, check_same_thread=False)  # ماکرو در رشتهٔ پس‌زمینه هم از آن می‌خواند
+        db.execute("PRAGMA journal_mode=WAL")
+        if db.execute("PRAGMA user_version").fetchone()[0] != CACHE_SCHEMA:
+            db.execute("DROP TABLE IF EXISTS paragraphs")
+            db.execute(f"PRAGMA user_version = {CACHE_SCHEMA}")
+        db.execute("CREATE TABLE IF NOT EXISTS paragraphs (key BLOB PRIMARY KEY, text TEXT NOT NULL, "
+                   "counts TEXT NOT NULL, edits TEXT, size INTEGER NOT NULL, used INTEGER NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS paragraphs_used ON paragraphs (used)")
+        return db
+
+    @staticmethod
+    def make_key(namespace, text):
+        return hashlib.blake2b(namespace.encode("utf-8") + b"\0" + text.encode("utf-8"), digest_size=16).digest()
+
+    # خروجی (متن اصلاح‌شده, شمارش‌های غیرصفر, ویرایش‌ها یا None) یا None
+    def get(self, key):
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+            return entry
+        entry = self._pending.get(key)
+        if entry is None and self.db is not None:
+            try: row = self.db.execute("SELECT text, counts, edits FROM paragraphs WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e: log_error("ParagraphCache.get", e); row = None
+            if row:
+                edits = None if row[2] is None else [tuple(edit) for edit in json.loads(row[2])]
+                entry = (row[0], json.loads(row[1]), edits); self._touched.add(key)
+        if entry is not None: self._remember(key, entry)
+        return entry
+
+    def put(self, key, text, counts, edits=None):
+        self._remember(key, (text, counts, edits))
+        if self.db is not None:
+            self._pending[key] = (text, counts, edits)
+            if len(self._pending) >= CACHE_FLUSH_ENTRIES: self.flush()
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        if len(self.memory) > self.memory_entries: self.memory.popitem(last=False)
+
+    # نوشتن رکوردهای تازه و زمان استفادهٔ رکوردهای خوانده‌شده روی دیسک
+    def flush(self):
+        if self.db is None or not (self._pending or self._touched): return
+        now = int(time.time())
+        rows = []
+        for key, (text, counts, edits) in self._pending.items():
+            edits = None if edits is None else json.dumps(edits, ensure_ascii=False)
+            rows.append((key, text, json.dumps(counts, ensure_ascii=False), edits, len(key) + 2 * len(text) + 2 * len(edits or ""), now))
+        touched = [(now, key) for key in self._touched if key not in self._pending]
+        self._pending, self._touched = {}, set()
+        try:
+            with self.db:
+                self.db.executemany("INSERT OR REPLACE INTO paragraphs VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self.db.executemany("UPDATE paragraphs SET used = ? WHERE key = ?", touched)
+            self._evict()
+        except sqlite3.Error as e: log_error("ParagraphCache.flush", e)
+
+    # حذف قدیمی‌ترین یک‌چهارم رکوردها تا حجم استفاده‌شدهٔ پایگاه از سقف کمتر شود
+    def _evict(self):
+        while True:
+            page_size = self.db.execute("PRAGMA page_size").fetchone()[0]
+            used = (self.db.execute("PRAGMA page_count").fetchone()[0] - self.db.execute("PRAGMA freelist_count").fetchone()[0]) * page_size
+            if used <= self.max_bytes: return
+            rows = self.db.execute("SELECT COUNT(*) FROM paragraphs").fetchone()[0]
+            if rows == 0: return
+            with self.db:
+                self.db.execute("DELETE FROM paragraphs WHERE key IN (SELECT key FROM paragraphs ORDER BY used LIMIT ?)",
+                                (max(1, rows // 4),))
+
+    def close(self):
+        self.flush()
+        if self.db is not None: self.db.close(); self.db = None
+
+class CachedPipeline:
+    """همان رابط FixPipeline؛ پاراگرافی که پیش‌تر با همین گزینه‌ها، همین بانک و همین نسخهٔ کد
+    اصلاح شده باشد دیگر از زنجیره نمی‌گذرد و فقط شمارش‌هایش (و برای edits ویرایش‌هایش) از حافظهٔ نهان می‌آید."""
+
+    def __init__(self, pipeline, cache):
+        self.pipeline, self.cache = pipeline, cache
+        self.key, self.stages = pipeline.key, pipeline.stages
+        dict_version = replacements_version() if FixOption.FIX_DICT.name in pipeline.key else ""
+        self.namespace = "|".join([source_version(), dict_version] + list(pipeline.key))
+        self.hits = self.misses = 0
+
+    def run(self, text, report_counts):
+        key = ParagraphCache.make_key(self.namespace, text)
+        entry = self.cache.get(key)
+        if entry is None:
+            self.misses += 1
+            counts = get_initial_report_counts()
+            fixed = self.pipeline.run(text, counts)
+            entry = (fixed, {k: v for k, v in counts.items() if v}, None)
+            self.cache.put(key, *entry)
+        else:
+            self.hits += 1
+        merge_report_counts(report_counts, entry[1])
+        return entry[0]
+
+    # رکوردی که فقط با run ساخته شده ویرایش ندارد؛ آن پاراگراف یک بار دیگر با edits اصلاح و رکوردش کامل می‌شود
+    def edits(self, text, report_counts):
+        key = ParagraphCache.make_key(self.namespace, text)
+        entry = self.cache.get(key)
+        if entry is None or entry[2] is None:
+            self.misses += 1
+            counts = get_initial_report_counts()
+            fixed, edits = self.pipeline.edits(text, counts)
+            entry = (fixed, {k: v for k, v in counts.items() if v}, edits)
+            self.cache.put(key, *entry)
+        else:
+            self.hits += 1
+        merge_report_counts(report_counts, entry[1])
+        return entry[0], entry[2]
+
+_PARAGRAPH_CACHES = {}
+
+# یک حافظهٔ نهان مشترک برای هر مسیر، تا لایهٔ حافظه میان اجراهای ماکرو هم بماند
+def get_paragraph_cache(path=CACHE_FILE):
+    cache = _PARAGRAPH_CACHES.get(path)
+    if cache is None:
+        cache = _PARAGRAPH_CACHES[path] = ParagraphCache(path)
+    return cache
+
+# ---------- خواندن و نوشتن گروهی سند (UNO) ----------
+EDIT_MERGE_GAP = 8           # تغییرهایی که کمتر از این فاصله دارند با یک setString نوشته می‌شوند
+CURSOR_STEP = 32767          # goRight/goLeft شمارندهٔ short می‌گیرند
+UNDO_TITLE = "پاک‌نویس"
+
+# ویرایش‌های (آغاز, طول, جایگزین, دسته) پاراگرافی که بی‌ویرایش (فقط با run) اصلاح شده؛ زنجیره دوباره با edits اجرا
+# می‌شود (شمارش‌ها پیش‌تر گرفته شده‌اند). اگر نتیجه با متن اصلاح‌شده نخواند، مثلاً چون متن از پردازه‌ای با بانک دیگر
+# آمده، کل پاراگراف یک ویرایش می‌شود.
+def change_edits(pipeline, old_text, new_text):
+    fixed, edits = pipeline.edits(old_text, get_initial_report_counts())
+    return edits if fixed == new_text else [(0, len(old_text), new_text, None)]
+
+# فهرست (بازه, متن قدیم, ویرایش‌ها) پاراگراف‌های تغییرکرده؛ results برای هر پاراگراف (متن اصلاح‌شده, ویرایش‌ها) است
+# که در همان گذر اصلاح ساخته شده‌اند. change_edits فقط برای نتیجه‌ای است که ویرایش‌هایش None است.
+def document_changes(paragraphs, results, pipeline):
+    return [(paragraph, old_text, change_edits(pipeline, old_text, new_text) if edits is None else edits)
+            for (paragraph, old_text), (new_text, edits) in zip(paragraphs, results) if new_text != old_text]
+
+# بازه‌های نوشتن به صورت (آغاز, پایان, متن تازه) بر حسب نویسه‌های متن قدیم، به ترتیب؛ ویرایش‌هایی که کمتر از gap
+# فاصله دارند یکی می‌شوند. درج خالص نویسهٔ کناری را هم در بر می‌گیرد تا هر بازه پیش از نوشتن در سند وارسی‌پذیر باشد.
+def paragraph_edits(old_text, edits, gap=EDIT_MERGE_GAP):
+    spans = []
+    for start, length, replacement, _ in edits:
+        end = start + length
+        if spans and start - spans[-1][1] <= gap:
+            begin, last, text = spans[-1]
+            spans[-1] = (begin, end, text + old_text[last:start] + replacement)
+            continue
+        if start == end:
+            if start > 0: start, replacement = start - 1, old_text[start - 1] + replacement
+            else: end, replacement = end + 1, replacement + old_text[:1]
+        spans.append((start, end, replacement))
+    return spans
+
+def move_cursor_right(cursor, count, expand, uno_call):
+    while count > 0:
+        step = min(count, CURSOR_STEP)
+        if not uno_call("move", cursor.goRight, step, expand): return False
+        count -= step
+    return True
+
+# نوشتن فقط بازه‌های ویرایش‌ها (از آخر به اول تا جای بازه‌های قبلی جابه‌جا نشود)؛ قالب‌بندی بقیهٔ متن می‌ماند.
+# اگر جای بازه در سند با متن خوانده‌شده نخواند (مثلاً فیلد یا لنگر درون پاراگراف)، کل بازه مثل گذشته یک‌جا نوشته می‌شود.
+def apply_range_edits(text_range, old_text, edits, uno_call):
+    text, start = text_range.getText(), text_range.getStart()
+    cursor = uno_call("move", text.createTextCursorByRange, start)
+    for begin, end, replacement in reversed(paragraph_edits(old_text, edits)):
+        uno_call("move", cursor.gotoRange, start, False)
+        if not (move_cursor_right(cursor, begin, False, uno_call) and move_cursor_right(cursor, end - begin, True, uno_call)
+                and uno_call("read", cursor.getString) == old_text[begin:end]):
+            uno_call("write", text.createTextCursorByRange(text_range).setString, apply_edits(old_text, edits))
+            return False
+        uno_call("write", cursor.setString, replacement)
+    return True
+
+# پاراگراف‌های یک XText به ترتیب، همراه با پاراگراف‌های خانه‌های جدول‌ها (و جدول‌های تودرتو)
+def iter_text_paragraphs(text, uno_call):
+    elements = uno_call("move", text.createEnumeration)
+    while uno_call("move", elements.hasMoreElements):
+        element = uno_call("move", elements.nextElement)
+        if element.supportsService("com.sun.star.text.TextTable"):
+            for name in element.getCellNames(): yield from iter_text_paragraphs(element.getCellByName(name), uno_call)
+        else: yield element
+
+# همهٔ متن‌های سند: متن اصلی، پانویس‌ها و پی‌نویس‌ها، قاب‌ها و سرصفحه/پاصفحهٔ سبک‌های صفحه (متن مشترک فقط یک بار)
+def iter_document_texts(doc):
+    yield doc.Text
+    for notes in (doc.Footnotes, doc.Endnotes):
+        for i in range(notes.getCount()): yield notes.getByIndex(i)
+    frames = doc.TextFrames
+    for name in frames.getElementNames(): yield frames.getByName(name).getText()
+    styles = doc.StyleFamilies.getByName("PageStyles")
+    for name in styles.getElementNames():
+        style = styles.getByName(name)
+        for part in ("Header", "Footer"):
+            try:
+                if not style.getPropertyValue(f"{part}IsOn"): continue
+                yield style.getPropertyValue(f"{part}Text")
+                if not style.getPropertyValue(f"{part}IsShared"): yield style.getPropertyValue(f"{part}TextLeft")
+                if style.getPropertySetInfo().hasPropertyByName("FirstIsShared") and not style.getPropertyValue("FirstIsShared"):
+                    yield style.getPropertyValue(f"{part}TextFirst")
+            except Exception as e: log_error(f"iter_document_texts - {name} {part}", e)
+
+# changes فهرست (بازه, متن قدیم, ویرایش‌ها) است. با verify پاراگرافی که متنش از زمان خواندن عوض شده
+# (یا دیگر وجود ندارد) کنار گذاشته می‌شود؛ خروجی تعداد آن‌ها
+def apply_changes(changes, uno_call, verify=False):
+    skipped = 0
+    for text_range, old_text, edits in changes:
+        if verify:
+            try: current = uno_call("read", text_range.getString)
+            except Exception: current = None
+            if current != old_text: skipped += 1; continue
+        apply_range_edits(text_range, old_text, edits, uno_call)
+    return skipped
+
+# اجرای func در حالی که نمایش و صفحه‌آرایی سند قفل است و همهٔ تغییرها یک کار «واگرد» می‌شوند
+def edit_document_locked(doc, func, *args):
+    undo = doc.getUndoManager()
+    doc.lockControllers(); doc.addActionLock()
+    undo.enterUndoContext(UNDO_TITLE)
+    try: return func(*args)
+    finally:
+        undo.leaveUndoContext()
+        doc.removeActionLock(); doc.unlockControllers()
+
+# اصلاح کل سند در سه گام: خواندن همهٔ پاراگراف‌ها، اصلاح در پایتون و سپس نوشتن فقط تغییرها؛ خروجی تعداد پاراگراف‌های تغییرکرده.
+# fix_many(متن‌ها, شمارش‌ها) اگر داده شود همهٔ پاراگراف‌ها را یک‌جا اصلاح می‌کند و برای هر کدام (متن اصلاح‌شده, ویرایش‌ها)
+# برمی‌گرداند (مثلاً fix_paragraphs با edits و چند پردازه).
+def fix_document(doc, pipeline, report_counts, uno_call, fix_many=None):
+    paragraphs = [(paragraph, uno_call("read", paragraph.getString))
+                  for text in iter_document_texts(doc) for paragraph in iter_text_paragraphs(text, uno_call)]
+    old_texts = [old_text for _, old_text in paragraphs]
+    if fix_many: results = fix_many(old_texts, report_counts)
+    else: results = [fix_paragraph(pipeline, old_text, report_counts, True) for old_text in old_texts]
+    changes = document_changes(paragraphs, results, pipeline)
+    if changes: edit_document_locked(doc, apply_changes, changes, uno_call)
+    return len(changes)
+
+# ---------- اجرای بومی مراحل نویسه‌ای (replaceAll لیبره‌آفیس) ----------
+# مراحل بی‌نیاز از بافت که در زنجیره پیش یا پس از بقیهٔ مراحل می‌آیند؛ با همین ترتیب روی کل سند
+# اجرا شوند نتیجه همان اجرای پاراگراف‌به‌پاراگراف است، و متن برای آن‌ها رفت‌وبرگشتی به پایتون ندارد.
+NATIVE_LEADING_OPTIONS = FUSED_CHAR_OPTIONS
+NATIVE_TRAILING_OPTIONS = (FixOption.FIX_ELLIPSIS.name, FixOption.FIX_FAKE_HYPHENS.name)
+# الگوهای عبارت منظم هر گزینه پس از جایگزینی‌های نویسه‌ای آن: (الگو, جایگزین, دستهٔ گزارش)
+NATIVE_PATTERNS = {
+    FixOption.FIX_PUNCT.name: [("؟{2,}", "؟", "علامت پرسش تکراری"), ("!{2,}", "!", "علامت تعجب تکراری")],
+    FixOption.FIX_ELLIPSIS.name: [(r"\.{3,}", "…", "سه‌نقطهٔ تعلیق")],
+}
+
+# فهرست (جست‌وجو, جایگزین, عبارت منظم؟, دستهٔ گزارش) برای گزینه‌های داده‌شده به ترتیب زنجیره
+def native_replacements(option_names):
+    replacements = []
+    for name in option_names:
+        replacements += [(src, dst, False, category) for src, (dst, category) in CHAR_FIXES.get(name, {}).items()]
+        replacements += [(pattern, dst, True, category) for pattern, dst, category in NATIVE_PATTERNS.get(name, ())]
+    return replacements
+
+class NativeReplacer:
+    """مراحل نویسه‌ای فعال که با XReplaceable.replaceAll روی کل سند (با همهٔ جدول‌ها، قاب‌ها و پانویس‌ها)
+    اجرا می‌شوند؛ شمارش هر دسته همان تعداد جایگزینی‌هاست. python_options بقیهٔ زنجیره است."""
+
+    def __init__(self, options):
+        enabled = lambda names: [name for name in names if options.get(name, True)]
+        self.leading = native_replacements(enabled(NATIVE_LEADING_OPTIONS))
+        self.trailing = native_replacements(enabled(NATIVE_TRAILING_OPTIONS))
+        self.python_options = dict(options)
+        self.python_options.update({name: False for name in enabled(NATIVE_LEADING_OPTIONS + NATIVE_TRAILING_OPTIONS)})
+
+    def replace_all(self, doc, replacements, report_counts, uno_call):
+        descriptor = doc.createReplaceDescriptor()
+        descriptor.SearchCaseSensitive = True
+        for search, replace, regex, category in replacements:
+            descriptor.SearchString, descriptor.ReplaceString = search, replace
+            descriptor.SearchRegularExpression = regex
+            n = uno_call("replace", doc.replaceAll, descriptor)
+            if category: report_counts[category] += n
+
+# مراحل آغازین بومی، سپس بقیهٔ زنجیره با fix_document و در پایان مراحل پایانی بومی؛ همه در یک کار «واگرد»
+def fix_document_native(doc, native, pipeline, report_counts, uno_call, fix_many=None):
+    native.replace_all(doc, native.leading, report_counts, uno_call)
+    changed = fix_document(doc, pipeline, report_counts, uno_call, fix_many)
+    native.replace_all(doc, native.trailing, report_counts, uno_call)
+    return changed
+
+# ---------- پردازه‌های کمکی ماکرو ----------
+# درون لیبره‌آفیس ماژول ماکرو با نامی ساختگی اجرا می‌شود که pickle نمی‌تواند دوباره پیدایش کند و sys.executable
+# خود برنامه است؛ پس پردازه‌های کمکی با spawn و یک مفسر پایتون جداگانه ساخته می‌شوند و همین فایل را با نام خودش وارد می‌کنند.
+def importable_module():
+    name = os.path.splitext(os.path.basename(__file__))[0]
+    if name == __name__: return sys.modules[__name__]
+    directory = os.path.dirname(os.path.abspath(__file__))
+    if directory not in sys.path: sys.path.append(directory)
+    return importlib.import_module(name)
+
+# زمینهٔ ساخت پردازه‌ها؛ None یعنی پیش‌فرض پایتون و False یعنی مفسری برای پردازه‌های کمکی پیدا نشد
+def process_context():
+    if uno is None: return None
+    python = sys.executable if os.path.basename(sys.executable or "").lower().startswith("python") else shutil.which("python3")
+    if not python: return False
+    import multiprocessing
+    context = multiprocessing.get_context("spawn")
+    context.set_executable(python)
+    return context
+
+# fix_many برای fix_document: پاراگراف‌های سندهای بزرگ با fix_paragraphs میان پردازه‌ها پخش می‌شوند
+def macro_fix_many(options, pipeline, metrics):
+    try: module = importable_module()
+    except Exception as e:
+        log_error("macro_fix_many", e)
+        return None
+    return lambda texts, report_counts, progress=None, cancelled=None: module.fix_paragraphs(
+        texts, options, report_counts, pipeline, cache_path=CACHE_FILE, metrics=metrics, progress=progress,
+        cancelled=cancelled, edits=True)
+
+# ---------- اجرای پس‌زمینه ----------
+BACKGROUND_BATCH_CHARS = 50000   # بیشترین اندازهٔ هر تکه از پاراگراف‌ها میان دو گزارش پیشرفت و بررسی لغو
+PROGRESS_INTERVAL = 0.25         # کمترین فاصلهٔ به‌روزرسانی نوار وضعیت (ثانیه)
+_BACKGROUND_JOB = None
+
+if unohelper is not None:
+    class MainThreadCallback(unohelper.Base, XCallback):
+        """اجرای یک تابع پایتون در رشتهٔ اصلی لیبره‌آفیس (از طریق AsyncCallback)."""
+        def __init__(self, func, *args):
+            self.func, self.args = func, args
+        def notify(self, data):
+            try: self.func(*self.args)
+            except Exception as e: log_error("MainThreadCallback", e)
+
+class BackgroundFix:
+    """اصلاح کل سند در رشتهٔ جداگانه تا لیبره‌آفیس در این مدت پاسخ‌گو بماند. خواندن پاراگراف‌ها و اجرای زنجیره
+    بیرون از رشتهٔ رابط کاربری انجام می‌شود؛ پیشرفت در نوار وضعیت پنجره و نوشتن تغییرها (یک کار «واگرد»)
+    در رشتهٔ اصلی. سند تا گام نوشتن دست نمی‌خورد، پس لغو فقط نتیجه‌ها را رها می‌کند."""
+
+    def __init__(self, doc, pipeline, report_counts, uno_call, fix_many=None, metrics=None):
+        ctx = uno.getComponentContext()
+        self.doc, self.pipeline, self.report_counts, self.uno_call = doc, pipeline, report_counts, uno_call
+        self.fix_many, self.metrics = fix_many, metrics
+        self.main_thread = ctx.ServiceManager.createInstanceWithContext("com.sun.star.awt.AsyncCallback", ctx)
+        self.indicator = doc.CurrentController.Frame.createStatusIndicator()
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="Paknevis", daemon=True)
+        self._last_progress = 0.0
+
+    def start(self):
+        global _BACKGROUND_JOB
+        _BACKGROUND_JOB = self
+        self.indicator.start("پاک‌نویس: خواندن سند…", 0)
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def running(self):
+        return self.thread.is_alive() or _BACKGROUND_JOB is self
+
+    def _call_main(self, func, *args):
+        self.main_thread.addCallback(MainThreadCallback(func, *args), None)
+
+    def _progress(self, done, total, chars, started):
+        now = time.perf_counter()
+        if now - self._last_progress < PROGRESS_INTERVAL and done < total: return
+        self._last_progress = now
+        rate = int(chars / max(now - started, 1e-6))
+        text = f"پاک‌نویس: {en_numbers_to_fa(str(done))} از {en_numbers_to_fa(str(total))} پاراگراف — {en_numbers_to_fa(str(rate))} نویسه در ثانیه"
+        self._call_main(self._show_progress, text, done, total)
+
+    def _show_progress(self, text, done, total):
+        if self.cancelled.is_set(): return
+        self.indicator.start(text, total) if done == 0 else self.indicator.setText(text)
+        self.indicator.setValue(done)
+
+    # رشتهٔ پس‌زمینه: خواندن همهٔ پاراگراف‌ها و اصلاح همهٔ آن‌ها با یک فراخوانی، تا تصمیم پخش میان پردازه‌ها
+    # بر پایهٔ حجم کل سند گرفته شود؛ fix_paragraphs میان تکه‌ها پیشرفت را گزارش و لغو را بررسی می‌کند
+    def _run(self):
+        try:
+            uno_call, paragraphs = self.uno_call, []
+            for text in iter_document_texts(self.doc):
+                for paragraph in iter_text_paragraphs(text, uno_call):
+                    if self.cancelled.is_set(): return self._call_main(self._finish, None)
+                    paragraphs.append((paragraph, uno_call("read", paragraph.getString)))
+            total, started = len(paragraphs), time.perf_counter()
+            self._progress(0, total, 0, started)
+            old_texts = [old_text for _, old_text in paragraphs]
+            progress = lambda done, chars: self._progress(done, total, chars, started)
+            if self.fix_many: results = self.fix_many(old_texts, self.report_counts, progress, self.cancelled)
+            else: results = fix_paragraphs(old_texts, None, self.report_counts, self.pipeline, 1,
+                                           progress=progress, cancelled=self.cancelled, edits=True)
+            if results is None or self.cancelled.is_set(): return self._call_main(self._finish, None)
+            # بازه‌های ویرایش همراه متن اصلاح‌شده آمده‌اند؛ رشتهٔ اصلی فقط می‌نویسد
+            self._call_main(self._finish, document_changes(paragraphs, results, self.pipeline))
+        except Exception as e:
+            log_error("BackgroundFix", e)
+            self._call_main(self._finish, None)
+
+    # رشتهٔ اصلی: نوشتن تغییرها (مگر لغو شده باشد) و نمایش گزارش
+    def _finish(self, changes):
+        global _BACKGROUND_JOB
+        try:
+            self.indicator.end()
+            if changes is None or self.cancelled.is_set(): return
+            # پاراگرافی که کاربر در این فاصله ویرایش کرده دست نمی‌خورد
+            skipped = edit_document_locked(self.doc, apply_changes, changes, self.uno_call, True)
+            self.pipeline.cache.flush()
+            if self.metrics: self.metrics.add_cache(self.pipeline)
+            notes = [f"پاراگراف‌های ویرایش‌شده در حین اجرا (اصلاح‌نشده): {en_numbers_to_fa(str(skipped))}"] if skipped else []
+            show_fix_report(self.doc, self.report_counts, self.metrics, notes)
+        finally:
+            if _BACKGROUND_JOB is self: _BACKGROUND_JOB = None
+
+# اگر اصلاحی در پس‌زمینه در جریان است، پرسش برای لغو آن؛ خروجی True یعنی ماکرو نباید کار تازه‌ای آغاز کند
+def ask_cancel_background(doc):
+    job = _BACKGROUND_JOB
+    if job is None or not job.running(): return False
+    try:
+        parent_win = doc.CurrentController.Frame.ContainerWindow
+        box = parent_win.getToolkit().createMessageBox(parent_win, QUERYBOX, MBButtons.BUTTONS_YES_NO, "پاک‌نویس",
+                                                       "اصلاح سند در پس‌زمینه در جریان است. لغو شود؟")
+        if box.execute() == MESSAGE_BOX_YES: job.cancel()
+    except Exception as e: log_error("ask_cancel_background", e)
+    return True
+
+# ---------- حالت زنده (اصلاح هنگام تایپ) ----------
+LIVE_DEBOUNCE = 0.6   # درنگ پس از آخرین ویرایش پیش از اصلاح پاراگراف (ثانیه)
+# واژهٔ چسبیده به مکان‌نما (حرف، عدد، نیم‌فاصله و اعراب) که ممکن است هنوز در حال تایپ باشد: بخش پیش و پس از مکان‌نما
+LIVE_TYPING_WORD = re.compile(r"[\w\u200c\u064B-\u065F\u0670]*\Z")
+LIVE_WORD_REST = re.compile(r"[\w\u200c\u064B-\u065F\u0670]*")
+_LIVE_SESSIONS = {}   # RuntimeUID سند ← LiveSession
+
+if unohelper is not None:
+    class LiveModifyListener(unohelper.Base, XModifyListener):
+        def __init__(self, session):
+            self.session = session
+        def modified(self, event):
+            self.session.on_modified()
+        def disposing(self, event):
+            self.session.stop(detach=False)
+
+class LiveSession:
+    """حالت زنده برای یک سند. زنجیره و بانک واژه‌ها یک بار هنگام روشن شدن آماده می‌شوند و پس از هر ویرایش،
+    با درنگ LIVE_DEBOUNCE، فقط پاراگراف محل مکان‌نما اصلاح می‌شود؛ پس هزینهٔ هر بار به طول همان پاراگراف
+    بستگی دارد نه طول سند. واژه‌ای که مکان‌نما در آن است تا تمام نشده اصلاح نمی‌شود. شمارش اصلاحات در tally جمع می‌شود و هنگام خاموش کردن گزارش داده می‌شود."""
+
+    def __init__(self, doc, options):
+        ctx = uno.getComponentContext()
+        self.doc, self.key = doc, doc.RuntimeUID
+        self.pipeline = get_pipeline(options)
+        if FixOption.FIX_DICT.name in self.pipeline.key and get_replacements(): get_dict_matcher()
+        self.tally = get_initial_report_counts()
+        self.main_thread = ctx.ServiceManager.createInstanceWithContext("com.sun.star.awt.AsyncCallback", ctx)
+        self.listener = LiveModifyListener(self)
+        self.deadline, self.timer, self.applying = 0.0, None, False
+
+    def start(self):
+        _LIVE_SESSIONS[self.key] = self
+        self.doc.addModifyListener(self.listener)
+
+    def stop(self, detach=True):
+        _LIVE_SESSIONS.pop(self.key, None)
+        self.deadline = None
+        if detach:
+            try: self.doc.removeModifyListener(self.listener)
+            except Exception as e: log_error("LiveSession.stop", e)
+
+    # هر ویرایش فقط مهلت را جلو می‌برد؛ یک رشتهٔ زمان‌سنج تا گذشتن مهلت صبر می‌کند
+    def on_modified(self):
+        if self.applying or self.deadline is None: return
+        self.deadline = time.monotonic() + LIVE_DEBOUNCE
+        if self.timer is None or not self.timer.is_alive():
+            self.timer = threading.Thread(target=self._wait, name="Paknevis live", daemon=True)
+            self.timer.start()
+
+    def _wait(self):
+        while True:
+            deadline = self.deadline
+            if deadline is None: return
+            delay = deadline - time.monotonic()
+            if delay <= 0: break
+            time.sleep(delay)
+        self.main_thread.addCallback(MainThreadCallback(self.fix_current_paragraph), None)
+
+    # رشتهٔ اصلی: کل پاراگراف آغاز گزینش کاربر اصلاح می‌شود تا قاعده‌های وابسته به بافت (جفت کردن گیومه‌ها،
+    # فاصلهٔ پیش از نشانه‌ها) همهٔ متن را ببینند؛ فقط ویرایش‌هایی که به واژهٔ زیر مکان‌نما می‌رسند کنار گذاشته
+    # می‌شوند، چون آن واژه هنوز کامل نشده («من ت» نباید «منت» شود). گیومهٔ باز بی‌جفت هم تا تایپ جفتش
+    # دست نمی‌خورد و گیومه‌ها همه با هم نوشته می‌شوند یا هیچ‌کدام، چون fix_quotes آن‌ها را با شمردن جفت می‌کند.
+    # نوشتن بازه‌ای و یک کار «واگرد» است.
+    def fix_current_paragraph(self):
+        if self.deadline is None: return
+        view_cursor = self.doc.CurrentController.getViewCursor()
+        text = view_cursor.getText()
+        cursor = text.createTextCursorByRange(view_cursor.getStart())
+        cursor.gotoStartOfParagraph(True)
+        before = cursor.getString()
+        cursor.collapseToStart(); cursor.gotoEndOfParagraph(True)
+        old_text = cursor.getString()
+        if not old_text.startswith(before): return
+        start = LIVE_TYPING_WORD.search(before).start()
+        end = LIVE_WORD_REST.match(old_text, len(before)).end()
+        quotes = [i for i, ch in enumerate(old_text) if ch in QUOTE_CHARS]
+        if len(quotes) % 2: start, end = min(start, quotes[-1]), max(end, quotes[-1] + 1)
+        counts = get_initial_report_counts()
+        _, edits = self.pipeline.edits(old_text, counts)
+        touches = lambda edit: start <= edit[0] + edit[1] and edit[0] <= end
+        quote_edit = lambda edit: QUOTE_CATEGORY in edit[3].split(" + ")
+        kept = [edit for edit in edits if not touches(edit)]
+        if any(quote_edit(edit) for edit in edits if touches(edit)): kept = [edit for edit in kept if not quote_edit(edit)]
+        if not kept: return
+        if len(kept) == len(edits): merge_report_counts(self.tally, counts)
+        else:
+            # شمارش مراحل برای کل پاراگراف است؛ ویرایش‌های کنارگذاشته بار بعد شمرده می‌شوند، پس اینجا فقط نوشته‌شده‌ها
+            for *_, category in kept:
+                for name in category.split(" + "):
+                    if name in self.tally: self.tally[name] += 1
+        self.applying = True
+        try: edit_document_locked(self.doc, apply_range_edits, cursor, old_text, kept, lambda kind, func, *args: func(*args))
+        finally: self.applying = False
+
+# روشن و خاموش کردن حالت زنده برای سند جاری با تنظیمات ذخیره‌شده؛ هنگام خاموش شدن گزارش اصلاحات این مدت نمایش داده می‌شود
+def toggle_live_mode(event=None):
+    try:
+        ctx = uno.getComponentContext()
+        doc = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx).getCurrentComponent()
+        if not doc or not doc.supportsService("com.sun.star.text.TextDocument"): return
+        session = _LIVE_SESSIONS.get(doc.RuntimeUID)
+        if session:
+            session.stop()
+            show_fix_report(doc, session.tally)
+        else: LiveSession(doc, load_config()).start()
+    except Exception as e: log_error("toggle_live_mode", e)
 
 # ---------- ماکروی اصلی ----------
 # --- تابع اصلاح‌شده ---
@@ -413,6 +1873,7 @@ def fix_text_full(event=None):
         desktop = smgr.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
         doc = desktop.getCurrentComponent()
         if not doc or not doc.supportsService("com.sun.star.text.TextDocument"): return
+        if ask_cancel_background(doc): return
 
         options = load_config()
         
@@ -427,6 +1888,8 @@ def fix_text_full(event=None):
 
         # --- بقیه کد بدون تغییر باقی می‌ماند ---
         report_counts = get_initial_report_counts()
+        metrics = PipelineMetrics() if options.get(METRICS_SETTING) else None
+        uno_call = metrics.uno_call if metrics else lambda kind, func, *args: func(*args)
 
         selections = doc.CurrentSelection
         has_nonempty_selection = False
@@ -439,46 +1902,1152 @@ def fix_text_full(event=None):
             if not hasattr(sel, "String"): continue
             if sel.String and sel.String.strip(): has_nonempty_selection = True; break
 
+        # جایگزینی بومی همیشه کل سند را می‌گیرد، پس برای متن انتخاب‌شده همهٔ مراحل در پایتون اجرا می‌شوند.
+        # حالت بومی خودش سریع است و در همان لحظه اجرا می‌شود؛ اصلاح کل سند در بقیهٔ حالت‌ها به پس‌زمینه می‌رود
+        native = NativeReplacer(options) if options.get(NATIVE_SETTING) and not has_nonempty_selection else None
+        background = options.get(BACKGROUND_SETTING) and not has_nonempty_selection and not native
+        pipeline_options = native.python_options if native else options
+        pipeline = get_pipeline(pipeline_options)
+        if metrics: pipeline = MeasuredPipeline(pipeline, metrics)
+        pipeline = CachedPipeline(pipeline, get_paragraph_cache())
+
         if has_nonempty_selection:
+            changes = []
             for i in range(count):
                 try: sel = selections.getByIndex(i)
                 except Exception: continue
                 if not hasattr(sel, "String"): continue
-                old_text = sel.String
-                new_text = fix_all(old_text, options, report_counts)
-                if new_text != old_text: sel.String = new_text
+                old_text = uno_call("read", getattr, sel, "String")
+                new_text, edits = pipeline.edits(old_text, report_counts)
+                if new_text != old_text: changes.append((sel, old_text, edits))
+            if changes: edit_document_locked(doc, apply_changes, changes, uno_call)
         else:
-            text = doc.Text
-            cursor = text.createTextCursor()
-            cursor.gotoStart(False)
-            while True:
-                cursor.gotoEndOfParagraph(True)
-                old_text = cursor.getString()
-                if old_text:
-                    new_text = fix_all(old_text, options, report_counts)
-                    if new_text != old_text: cursor.setString(new_text)
-                if not cursor.gotoNextParagraph(False): break
-
-        total = sum(report_counts.values())
-        try:
-            parent_win = doc.CurrentController.Frame.ContainerWindow
-            mb = parent_win.getToolkit().createMessageBox(
-                parent_win, MESSAGEBOX, MBButtons.BUTTONS_OK, "گزارش اصلاح متن",
-                (f"مجموع اصلاحات: {en_numbers_to_fa(str(total))}\n" + "\n".join(f"{k}: {en_numbers_to_fa(str(v))}" for k,v in report_counts.items() if v>0) if total>0 else "هیچ اصلاحی لازم نبود.")
-            )
-            mb.execute()
-        except Exception as e: log_error("fix_text_full - MessageBox", e)
+            fix_many = macro_fix_many(pipeline_options, pipeline, metrics)
+            job = None
+            if background:
+                # بدون پنجره (مثلاً اجرای بی‌سر) همان اجرای هم‌زمان
+                try: job = BackgroundFix(doc, pipeline, report_counts, uno_call, fix_many, metrics)
+                except Exception as e: log_error("fix_text_full - background", e)
+            if job:
+                job.start()
+                if metrics: metrics.interactive_seconds = time.perf_counter() - metrics.started
+                return
+            if native: edit_document_locked(doc, fix_document_native, doc, native, pipeline, report_counts, uno_call, fix_many)
+            else: fix_document(doc, pipeline, report_counts, uno_call, fix_many)
+        pipeline.cache.flush()
+        if metrics:
+            metrics.add_cache(pipeline)
+            metrics.interactive_seconds = time.perf_counter() - metrics.started
+        show_fix_report(doc, report_counts, metrics)
+
+    except Exception as e: log_error("fix_text_full", e)
+
+# پیش‌نمایش اصلاحات کل سند با تنظیمات ذخیره‌شده، بدون هیچ تغییری در سند
+def preview_fixes(event=None):
+    try:
+        ctx = uno.getComponentContext()
+        doc = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx).getCurrentComponent()
+        if not doc or not doc.supportsService("com.sun.star.text.TextDocument"): return
+        report_counts = get_initial_report_counts()
+        preview = PreviewPipeline(get_pipeline(load_config()))
+        fix_document(doc, preview, report_counts, lambda kind, func, *args: func(*args),
+                     lambda texts, counts: preview.fix_many(texts, counts, edits=True))
+        show_preview_report(doc, report_counts, preview.entries)
+    except Exception as e: log_error("preview_fixes", e)
+
+# پوشه و نام سند برای فایل‌های گزارش (سند ذخیره‌نشده: پوشهٔ خانه)
+def report_location(doc):
+    url = doc.URL
+    if not url: return os.path.expanduser("~"), "Untitled"
+    path = unquote(urlparse(url).path)
+    return os.path.dirname(path), os.path.basename(path)
+
+def show_preview_report(doc, report_counts, entries):
+    preview_path = None
+    try:
+        folder, filename = report_location(doc)
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+        preview_path = os.path.join(folder, f"Paknevis Preview [{now}].txt")
+        with open(preview_path, "w", encoding="utf-8") as f:
+            f.write(f"نام فایل: {filename}\n\nویرایش‌های پیشنهادی: {en_numbers_to_fa(str(len(entries)))}\n")
+            for line in format_report_lines(report_counts): f.write(line + "\n")
+            f.write("\n")
+            for entry in entries: f.write(format_preview_entry(entry) + "\n")
+    except Exception as e:
+        log_error("show_preview_report - write preview file", e)
+        preview_path = None
+    try:
+        parent_win = doc.CurrentController.Frame.ContainerWindow
+        paragraphs = len({entry[0] for entry in entries})
+        message = (f"ویرایش‌های پیشنهادی: {en_numbers_to_fa(str(len(entries)))} در {en_numbers_to_fa(str(paragraphs))} پاراگراف\n"
+                   + "\n".join(format_report_lines(report_counts)) if entries else "هیچ اصلاحی لازم نیست.")
+        message += "\nسند تغییری نکرد."
+        if preview_path: message += f"\nفهرست ویرایش‌ها: {preview_path}"
+        parent_win.getToolkit().createMessageBox(parent_win, MESSAGEBOX, MBButtons.BUTTONS_OK, "پیش‌نمایش اصلاح متن", message).execute()
+    except Exception as e: log_error("show_preview_report - MessageBox", e)
+
+# پیام گزارش و فایل‌های گزارش (و سنجش) کنار سند؛ notes سطرهای افزوده به پیام است
+def show_fix_report(doc, report_counts, metrics=None, notes=()):
+    total = sum(report_counts.values())
+    try:
+        parent_win = doc.CurrentController.Frame.ContainerWindow
+        mb = parent_win.getToolkit().createMessageBox(
+            parent_win, MESSAGEBOX, MBButtons.BUTTONS_OK, "گزارش اصلاح متن",
+            (f"مجموع اصلاحات: {en_numbers_to_fa(str(total))}\n" + "\n".join(f"{k}: {en_numbers_to_fa(str(v))}" for k,v in report_counts.items() if v>0) if total>0 else "هیچ اصلاحی لازم نبود.")
+            + "".join(f"\n{note}" for note in notes)
+        )
+        mb.execute()
+    except Exception as e: log_error("show_fix_report - MessageBox", e)
+
+    try:
+        folder, filename = report_location(doc)
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+        report_path = os.path.join(folder, f"Paknevis Report [{now}].txt")
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(f"نام فایل: {filename}\n\nمجموع اصلاحات: {en_numbers_to_fa(str(total))}\n")
+            for k,v in report_counts.items():
+                if v>0: f.write(f"{k}: {en_numbers_to_fa(str(v))}\n")
+        if metrics:
+            with open(os.path.join(folder, f"Paknevis Metrics [{now}].json"), "w", encoding="utf-8") as f:
+                json.dump({"file": filename, "total": total, "counts": report_counts, "metrics": metrics.to_dict()},
+                          f, ensure_ascii=False, indent=2)
+    except Exception as e: log_error("show_fix_report - write report file", e)
+
+
+# ---------- پردازش مستقیم فایل‌های ‎.odt/.docx‎ (بدون لیبره‌آفیس) ----------
+ODF_TEXT_NS = "urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+OOXML_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+OOXML_MC_NS = "http://schemas.openxmlformats.org/markup-compatibility/2006"
+OBJECT_PLACEHOLDER = "￼"
+XML_CHUNK_SIZE = 1 << 16
+
+class XmlDialect:
+    """نام عنصرهای هر قالب بر حسب (فضای نام, نام محلی)؛ پیشوندها از عنصر ریشه خوانده می‌شوند.
+    paragraphs: عنصرهای پاراگراف؛ whitespace: عنصرهایی که خودشان فاصله/تب‌اند؛
+    text_holder: عنصری که فقط متن درونش جزو پاراگراف است (None یعنی هر متنی در پاراگراف)؛
+    run: اگر تعیین شود، عنصرهای whitespace، breaks و anchors فقط مستقیماً درون آن متن به حساب می‌آیند؛
+    breaks: شکست‌های سطر که در متن پاراگراف \n و هنگام بازنویسی مرز ثابت‌اند (خود عنصر دست نمی‌خورد)؛
+    anchors: عنصرهای خالی که جای شیئی بیرون از پاراگراف‌اند (ارجاع پانویس) و مثل عنصرهای مات نویسهٔ جانشین می‌گیرند؛
+    inline: عنصرهای قالب‌بندی که متن از آن‌ها عبور می‌کند؛ اگر opaque خالی باشد بقیه مات‌اند."""
+
+    def __init__(self, paragraphs, whitespace, inline=(), opaque=(), text_holder=None, run=None, odf_spaces=False,
+                 breaks=(), anchors=()):
+        self.paragraphs, self.whitespace, self.inline, self.opaque = paragraphs, whitespace, inline, opaque
+        self.text_holder, self.run, self.odf_spaces = text_holder, run, odf_spaces
+        self.breaks, self.anchors = breaks, anchors
+
+    # نام‌های کامل (با پیشوند) بر اساس اعلان‌های xmlns عنصر ریشه
+    def resolve(self, attrs):
+        prefixes = {}
+        for i in range(0, len(attrs), 2):
+            name, value = attrs[i], attrs[i + 1]
+            if name.startswith("xmlns:"): prefixes.setdefault(value, name[6:])
+        qualify = lambda ns, local: f"{prefixes[ns]}:{local}" if ns in prefixes else None
+        names = lambda items: {q for q in (qualify(ns, local) for ns, local in items) if q}
+        resolved = {
+            "paragraphs": names(self.paragraphs), "inline": names(self.inline), "opaque": names(self.opaque),
+            "breaks": names(self.breaks), "anchors": names(self.anchors),
+            "whitespace": {qualify(ns, local): value for (ns, local), value in self.whitespace.items() if qualify(ns, local)},
+            "text_holder": qualify(*self.text_holder) if self.text_holder else None,
+            "run": qualify(*self.run) if self.run else None,
+        }
+        resolved["space"] = qualify(ODF_TEXT_NS, "s")
+        resolved["tab"] = qualify(*next(iter(k for k, v in self.whitespace.items() if v == "\t")))
+        return resolved
+
+ODF_DIALECT = XmlDialect(
+    paragraphs=[(ODF_TEXT_NS, "p"), (ODF_TEXT_NS, "h")],
+    whitespace={(ODF_TEXT_NS, "s"): " ", (ODF_TEXT_NS, "tab"): "\t"},
+    inline=[(ODF_TEXT_NS, "span"), (ODF_TEXT_NS, "a"), (ODF_TEXT_NS, "meta")],
+    odf_spaces=True, breaks=[(ODF_TEXT_NS, "line-break")])
+
+OOXML_DIALECT = XmlDialect(
+    paragraphs=[(OOXML_W_NS, "p")],
+    whitespace={(OOXML_W_NS, "tab"): "\t"},
+    opaque=[(OOXML_W_NS, "drawing"), (OOXML_W_NS, "pict"), (OOXML_W_NS, "object"), (OOXML_MC_NS, "AlternateContent")],
+    text_holder=(OOXML_W_NS, "t"), run=(OOXML_W_NS, "r"), breaks=[(OOXML_W_NS, "br"), (OOXML_W_NS, "cr")],
+    anchors=[(OOXML_W_NS, "footnoteReference"), (OOXML_W_NS, "endnoteReference")])
+
+# بخش‌هایی از هر بسته که متن سند را دارند
+ODF_TEXT_PARTS = re.compile(r"(content|styles)\.xml")
+OOXML_TEXT_PARTS = re.compile(r"word/(document|footnotes|endnotes|header\d*|footer\d*)\.xml")
+OFFICE_FILE_EXTENSIONS = (".odt", ".docx")
+
+def xml_escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def xml_attr_escape(text):
+    return xml_escape(text).replace('"', "&quot;").replace("\t", "&#9;").replace("\n", "&#10;").replace("\r", "&#13;")
+
+class _TextSegment:
+    """یک تکه متن پیوسته در یک اجرای قالب‌بندی؛ kind برای docx نوع عنصر (t یا tab) است."""
+    def __init__(self, kind="", text=""):
+        self.kind, self.text = kind, text
+
+class _Opaque:
+    """عنصری مات درون پاراگراف (پانویس، قاب، فیلد یا شکست سطر) که در متن پاراگراف نویسهٔ char است."""
+    def __init__(self, markup, char=OBJECT_PLACEHOLDER):
+        self.markup, self.char = markup, char
+
+class _ParagraphFrame:
+    def __init__(self, name, start_tag):
+        self.name, self.start_tag = name, start_tag
+        self.raw, self.pieces = [], []   # نشانه‌گذاری اصلی و تکه‌های قابل بازسازی
+        self.parents, self.skip, self.in_text = [], 0, False
+        self.ignore_space = True         # قاعدهٔ فشرده‌سازی فاصله در ODF
+
+class _OpaqueFrame:
+    def __init__(self, start_tag):
+        self.parts, self.depth, self.has_content = [start_tag], 1, False
+
+# تقسیم متن جدید میان تکه‌های قبلی به کمک هم‌ترازی نویسه‌ای، تا مرز اجراهای قالب‌بندی حفظ شود
+def distribute_text(old_parts, new_text):
+    if len(old_parts) == 1: return [new_text]
+    old_text = "".join(old_parts)
+    if not old_text: return [new_text] + [""] * (len(old_parts) - 1)
+    owner = []
+    for k, part in enumerate(old_parts): owner.extend([k] * len(part))
+    result = [[] for _ in old_parts]
+    matcher = difflib.SequenceMatcher(None, old_text, new_text, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for i in range(i1, i2): result[owner[i]].append(new_text[j1 + i - i1])
+        elif tag == "replace":
+            result[owner[i1]].append(new_text[j1:j2])
+        elif tag == "insert":
+            result[owner[i1 - 1] if i1 > 0 else owner[0]].append(new_text[j1:j2])
+    return ["".join(r) for r in result]
+
+class XmlParagraphFixer:
+    """content.xml (یا document.xml) را به صورت جریانی می‌خواند و می‌نویسد؛ فقط پاراگراف جاری
+    در حافظه نگه داشته می‌شود و متن آن از زنجیرهٔ اصلاح می‌گذرد. اجراهای قالب‌بندی، پانویس‌ها
+    و قاب‌ها دست‌نخورده می‌مانند و فقط متن درون آن‌ها بازنویسی می‌شود."""
+
+    def __init__(self, dialect, pipeline, report_counts, write):
+        self.dialect, self.pipeline, self.report_counts = dialect, pipeline, report_counts
+        self.write, self.names, self.stack, self.out = write, None, [], []
+        self.changed, self._pending = False, None
+        # نویسه‌های جانشین عنصرهای مات و شکست‌های سطر؛ متن میان آن‌ها جداگانه هم‌تراز می‌شود
+        self.boundary_pattern = re.compile("([" + OBJECT_PLACEHOLDER + "\n])")
+
+    def feed_stream(self, stream):
+        parser = xml.parsers.expat.ParserCreate()
+        parser.ordered_attributes = True
+        parser.buffer_text = True
+        parser.XmlDeclHandler = self._xml_decl
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        parser.CharacterDataHandler = self._chars
+        parser.CommentHandler = lambda data: self._emit(f"<!--{data}-->")
+        parser.ProcessingInstructionHandler = lambda target, data: self._emit(f"<?{target} {data}?>")
+        while True:
+            chunk = stream.read(XML_CHUNK_SIZE)
+            if not chunk: break
+            parser.Parse(chunk, False)
+        parser.Parse(b"", True)
+        self._flush()
+
+    def _flush(self):
+        if self.out: self.write("".join(self.out).encode("utf-8")); self.out = []
+
+    def _xml_decl(self, version, encoding, standalone):
+        standalone = "" if standalone == -1 else f' standalone="{"yes" if standalone else "no"}"'
+        self._emit(f'<?xml version="{version}" encoding="UTF-8"{standalone}?>\n')
+
+    # افزودن نشانه‌گذاری به مقصد فعلی: پاراگراف، عنصر مات یا خروجی
+    def _emit(self, markup, is_start=False):
+        top = self.stack[-1] if self.stack else None
+        if isinstance(top, _ParagraphFrame): top.raw.append(markup); top.pieces.append(markup)
+        elif isinstance(top, _OpaqueFrame): top.parts.append(markup); top.has_content = True
+        else:
+            if len(self.out) > 512: self._flush()
+            self.out.append(markup)
+        self._pending = markup if is_start else None
+
+    # بستن عنصر؛ اگر بلافاصله پس از آغازش بسته شود به شکل <x/> نوشته می‌شود
+    def _emit_end(self, name, sinks):
+        pending, self._pending = self._pending, None
+        for sink in sinks:
+            if sink and sink[-1] is pending: sink[-1] = pending[:-1] + "/>"
+            else: sink.append(f"</{name}>")
+
+    def _start(self, name, attrs):
+        if self.names is None: self.names = self.dialect.resolve(attrs)
+        names = self.names
+        tag = "<" + name + "".join(f' {attrs[i]}="{xml_attr_escape(attrs[i + 1])}"' for i in range(0, len(attrs), 2)) + ">"
+        top = self.stack[-1] if self.stack else None
+        if name in names["paragraphs"]:
+            self.stack.append(_ParagraphFrame(name, tag)); self._pending = tag
+        elif isinstance(top, _ParagraphFrame):
+            if top.skip:
+                top.skip += 1
+            elif (name in names["breaks"] or name in names["anchors"]) and (not names["run"] or top.parents[-1:] == [names["run"]]):
+                char = "\n" if name in names["breaks"] else OBJECT_PLACEHOLDER
+                top.raw.append(tag); top.pieces.append(_Opaque(tag[:-1] + "/>", char)); top.skip = 1; self._pending = None
+                top.ignore_space = False
+            elif name in names["whitespace"] and (not names["run"] or top.parents[-1:] == [names["run"]]):
+                value = names["whitespace"][name]
+                if value == " ": value = " " * int(dict(zip(attrs[::2], attrs[1::2])).get(name.split(":")[0] + ":c", "1") or 1)
+                self._add_text(top, value, kind="tab", raw=tag, exact=True); top.skip = 1; self._pending = None
+            elif name == names["text_holder"]:
+                top.raw.append(tag); top.pieces.append(_TextSegment("t")); top.in_text = True; self._pending = tag
+            elif name in names["opaque"] or (not self.dialect.opaque and name not in names["inline"]):
+                self.stack.append(_OpaqueFrame(tag)); self._pending = tag
+            else:
+                top.parents.append(name); self._emit(tag, is_start=True)
+        elif isinstance(top, _OpaqueFrame):
+            top.depth += 1; self._emit(tag, is_start=True)
+        else:
+            self._emit(tag, is_start=True)
+
+    def _end(self, name):
+        top = self.stack[-1] if self.stack else None
+        if isinstance(top, _ParagraphFrame):
+            if top.skip:
+                top.skip -= 1
+                if not top.skip: top.raw[-1] = top.raw[-1][:-1] + "/>"
+                self._pending = None
+            elif top.in_text and name == self.names["text_holder"]:
+                top.in_text = False; self._emit_end(name, [top.raw])
+            elif not top.parents:
+                self.stack.pop()
+                if not top.raw and self._pending is top.start_tag: markup = top.start_tag[:-1] + "/>"
+                else: markup = self._finish_paragraph(top) + f"</{name}>"
+                self._pending = None
+                self._emit_into_parent(markup)
+            else:
+                top.parents.pop(); self._emit_end(name, [top.raw, top.pieces])
+        elif isinstance(top, _OpaqueFrame):
+            top.depth -= 1; self._emit_end(name, [top.parts])
+            if top.depth == 0:
+                self.stack.pop(); parent = self.stack[-1]
+                markup = "".join(top.parts)
+                parent.raw.append(markup); parent.pieces.append(_Opaque(markup) if top.has_content else markup)
+                if top.has_content: parent.ignore_space = False
+        else:
+            self._emit_end(name, [self.out])
+
+    def _emit_into_parent(self, markup):
+        top = self.stack[-1] if self.stack else None
+        if isinstance(top, _ParagraphFrame): top.raw.append(markup); top.pieces.append(markup)
+        elif isinstance(top, _OpaqueFrame): top.parts.append(markup); top.has_content = True
+        else:
+            if len(self.out) > 512: self._flush()
+            self.out.append(markup)
+
+    def _chars(self, data):
+        top = self.stack[-1] if self.stack else None
+        self._pending = None
+        if isinstance(top, _ParagraphFrame):
+            if top.skip: return
+            if self.dialect.text_holder and not top.in_text:
+                top.raw.append(xml_escape(data)); top.pieces.append(xml_escape(data))
+            elif self.dialect.text_holder:
+                top.raw.append(xml_escape(data)); top.pieces[-1].text += data
+            else:
+                self._add_text(top, data, raw=xml_escape(data))
+        elif isinstance(top, _OpaqueFrame):
+            top.parts.append(xml_escape(data)); top.has_content = True
+        else:
+            self._emit(xml_escape(data))
+
+    # متن پاراگراف ODF: فاصله‌های خام پشت سر هم یکی می‌شوند و فاصلهٔ آغاز پاراگراف نادیده گرفته می‌شود
+    def _add_text(self, frame, data, kind="", raw="", exact=False):
+        frame.raw.append(raw)
+        if not exact and self.dialect.odf_spaces:
+            data = re.sub(r"[ \t\r\n]+", " ", data)
+            if frame.ignore_space and data.startswith(" "): data = data[1:]
+            if data: frame.ignore_space = data.endswith(" ")
+        elif exact and self.dialect.odf_spaces:
+            frame.ignore_space = False
+        if not data: return
+        if self.dialect.odf_spaces and frame.pieces and isinstance(frame.pieces[-1], _TextSegment):
+            frame.pieces[-1].text += data
+        else:
+            frame.pieces.append(_TextSegment(kind, data))
+
+    # جای نویسه‌های مرزی متن؛ اصلاح باید آن‌ها را به همان ترتیب نگه دارد
+    def _boundaries(self, text):
+        return self.boundary_pattern.findall(text)
+
+    # هر نویسهٔ مرزی با یک نویسهٔ دو سویش؛ اگر اصلاح یکی از این‌ها را عوض کند احتمالاً قاعده‌ای از روی مرز گذشته است
+    def _boundary_context(self, text):
+        return [text[max(m.start() - 1, 0):m.end() + 1] for m in self.boundary_pattern.finditer(text)]
+
+    def _finish_paragraph(self, frame):
+        raw = frame.start_tag + "".join(frame.raw)
+        segments = [p for p in frame.pieces if isinstance(p, _TextSegment)]
+        if any(self.boundary_pattern.search(seg.text) for seg in segments): return raw
+        old_text = "".join(p.text if isinstance(p, _TextSegment) else p.char if isinstance(p, _Opaque) else ""
+                           for p in frame.pieces)
+        if not old_text: return raw
+        counts = get_initial_report_counts()
+        new_text = self.pipeline.run(old_text, counts)
+        if self._boundary_context(new_text) != self._boundary_context(old_text):
+            # قاعده‌ای از روی شکست سطر یا عنصر مات گذشته (مثلاً «کتاب⏎ها» یا نیم‌فاصله پس از ارجاع پانویس)؛
+            # متن میان هر دو مرز جداگانه اصلاح می‌شود
+            counts, parts = get_initial_report_counts(), self.boundary_pattern.split(old_text)
+            new_text = "".join(part if i % 2 or not part else self.pipeline.run(part, counts) for i, part in enumerate(parts))
+        if self._boundaries(new_text) != self._boundaries(old_text):
+            log_error("XmlParagraphFixer", ValueError("object placeholder moved; paragraph left unchanged"))
+            return raw
+        merge_report_counts(self.report_counts, counts)
+        if new_text == old_text: return raw
+        self.changed = True
+        # هر گروه تکه‌های میان دو عنصر مات جداگانه هم‌تراز می‌شود
+        groups, current = [], []
+        for piece in frame.pieces:
+            if isinstance(piece, _Opaque): groups.append(current); current = []
+            elif isinstance(piece, _TextSegment): current.append(piece)
+        groups.append(current)
+        for group, new_part in zip(groups, self.boundary_pattern.split(new_text)[::2]):
+            if not group: continue
+            for seg, seg_text in zip(group, distribute_text([seg.text for seg in group], new_part)):
+                seg.new_text = seg_text
+        out, state = [frame.start_tag], {"ignore_space": True}
+        for piece in frame.pieces:
+            if isinstance(piece, str): out.append(piece)
+            elif isinstance(piece, _Opaque): out.append(piece.markup); state["ignore_space"] = False
+            else: out.append(self._render(piece, state))
+        return "".join(out)
+
+    def _render(self, seg, state):
+        names, text = self.names, getattr(seg, "new_text", seg.text)
+        if self.dialect.odf_spaces:
+            out = []
+            for token in re.findall(r" +|\t|[^ \t]+", text):
+                if token == "\t": out.append(f"<{names['tab']}/>"); state["ignore_space"] = False
+                elif token[0] == " ":
+                    n = len(token)
+                    space = lambda k: f"<{names['space']}/>" if k == 1 else f'<{names["space"]} {names["space"].split(":")[0]}:c="{k}"/>'
+                    if state["ignore_space"]: out.append(space(n)); state["ignore_space"] = False
+                    else: out.append(" " + (space(n - 1) if n > 1 else "")); state["ignore_space"] = n == 1
+                else:
+                    out.append(xml_escape(token)); state["ignore_space"] = False
+            return "".join(out)
+        # docx: هر تکه یک <w:t> کامل (یا <w:tab/>) است و دوباره به همین شکل ساخته می‌شود
+        holder, out = names["text_holder"], []
+        for token in re.findall(r"\t|[^\t]+", text):
+            if token == "\t": out.append(f"<{names['tab']}/>")
+            else: out.append(f'<{holder} xml:space="preserve">{xml_escape(token)}</{holder}>')
+        return "".join(out)
 
+# اصلاح یک فایل ‎.odt‎ یا ‎.docx‎؛ بخش‌های متنی به صورت جریانی بازنویسی و بقیه بی‌تغییر کپی می‌شوند.
+# خروجی True است اگر متنی تغییر کرده باشد؛ در غیر این صورت dst نوشته نمی‌شود مگر با src فرق داشته باشد.
+# با dst=None هیچ فایلی نوشته نمی‌شود (برای PreviewPipeline)
+def fix_office_file(src, dst, pipeline, report_counts):
+    import zipfile
+    is_docx = src.lower().endswith(".docx")
+    dialect, text_parts = (OOXML_DIALECT, OOXML_TEXT_PARTS) if is_docx else (ODF_DIALECT, ODF_TEXT_PARTS)
+    if dst is None:
+        # فقط خواندن (پیش‌نمایش): بخش‌های متنی از زنجیره می‌گذرند و هیچ فایلی نوشته نمی‌شود
+        changed = False
+        with zipfile.ZipFile(src) as zin:
+            for info in zin.infolist():
+                if not text_parts.fullmatch(info.filename): continue
+                with zin.open(info) as source:
+                    fixer = XmlParagraphFixer(dialect, pipeline, report_counts, lambda data: None)
+                    fixer.feed_stream(source)
+                    changed = changed or fixer.changed
+        return changed
+    tmp_path, changed = dst + ".paknevis-tmp", False
+    try:
+        with zipfile.ZipFile(src) as zin, zipfile.ZipFile(tmp_path, "w") as zout:
+            for info in zin.infolist():
+                out_info = zipfile.ZipInfo(info.filename, info.date_time)
+                out_info.compress_type, out_info.external_attr = info.compress_type, info.external_attr
+                out_info.create_system = info.create_system
+                if info.filename == "mimetype" or info.is_dir():
+                    zout.writestr(out_info, zin.read(info)); continue
+                with zin.open(info) as source, zout.open(out_info, "w", force_zip64=info.file_size > (1 << 30)) as target:
+                    if text_parts.fullmatch(info.filename):
+                        fixer = XmlParagraphFixer(dialect, pipeline, report_counts, target.write)
+                        fixer.feed_stream(source)
+                        changed = changed or fixer.changed
+                    else:
+                        shutil.copyfileobj(source, target)
+        if changed or os.path.abspath(dst) != os.path.abspath(src): os.replace(tmp_path, dst)
+        return changed
+    finally:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+
+# ---------- حالت خط فرمان (بدون لیبره‌آفیس) ----------
+TEXT_FILE_EXTENSIONS = (".txt", ".md") + OFFICE_FILE_EXTENSIONS
+
+# اصلاح متن ساده؛ هر خط یک پاراگراف است، همان‌طور که لیبره‌آفیس فایل متنی را باز می‌کند.
+# fix_many مثل fix_document است (همهٔ خط‌ها یک‌جا، مثلاً worker_fix_paragraphs).
+def fix_plain_text(text, pipeline, report_counts, fix_many=None):
+    lines = text.split("\n")
+    bodies = [line[:-1] if line.endswith("\r") else line for line in lines]
+    if fix_many: new_bodies = fix_many(bodies, report_counts)
+    else: new_bodies = [pipeline.run(body, report_counts) if body else body for body in bodies]
+    for i, (body, new_body) in enumerate(zip(bodies, new_bodies)):
+        if new_body != body: lines[i] = new_body + lines[i][len(body):]
+    return "\n".join(lines)
+
+# ---------- اصلاح موازی پاراگراف‌های یک سند ----------
+PARALLEL_MIN_CHARS = 200000       # متن‌های کوتاه‌تر در همین پردازه اصلاح می‌شوند
+PARALLEL_CHUNKS_PER_WORKER = 4
+_PARAGRAPH_POOL = None            # (کلید تنظیمات, ProcessPoolExecutor) که میان فراخوانی‌ها گرم می‌ماند
+
+# تقسیم پیوستهٔ پاراگراف‌ها به count تکه با حجم تقریباً برابر
+def split_chunks(texts, count):
+    size, chunks, current, filled = sum(map(len, texts)) / count, [], [], 0
+    for text in texts:
+        current.append(text); filled += len(text)
+        if filled >= size: chunks.append(current); current, filled = [], 0
+    if current: chunks.append(current)
+    return chunks
+
+def get_paragraph_pool(options, workers, replacements_path=None, cache_path=None, metrics=False, context=None):
+    global _PARAGRAPH_POOL
+    key = (options_key(options), workers, replacements_path, cache_path, metrics)
+    if _PARAGRAPH_POOL and _PARAGRAPH_POOL[0] == key: return _PARAGRAPH_POOL[1]
+    shutdown_paragraph_pool()
+    from concurrent.futures import ProcessPoolExecutor
+    pool = ProcessPoolExecutor(workers, mp_context=context, initializer=init_batch_worker,
+                               initargs=(options, replacements_path, cache_path, metrics))
+    _PARAGRAPH_POOL = (key, pool)
+    return pool
+
+def shutdown_paragraph_pool():
+    global _PARAGRAPH_POOL
+    if _PARAGRAPH_POOL: _PARAGRAPH_POOL[1].shutdown(cancel_futures=True)
+    _PARAGRAPH_POOL = None
+
+# اصلاح یک پاراگراف (خالی دست نمی‌خورد)؛ با edits خروجی (متن اصلاح‌شده, ویرایش‌ها) است
+def fix_paragraph(pipeline, text, report_counts, edits=False):
+    if edits: return pipeline.edits(text, report_counts) if text else (text, [])
+    return pipeline.run(text, report_counts) if text else text
+
+# اصلاح یک تکه از پاراگراف‌ها در پردازهٔ کمکی؛ خروجی (نتیجه‌های fix_paragraph, شمارش‌ها, سنجش مراحل یا None)
+def fix_paragraph_chunk(texts, edits=False):
+    report_counts = get_initial_report_counts()
+    metrics, cache_state = None, (getattr(_WORKER_PIPELINE, "hits", 0), getattr(_WORKER_PIPELINE, "misses", 0))
+    if _WORKER_MEASURED: metrics = _WORKER_MEASURED.metrics = PipelineMetrics()
+    fixed = [fix_paragraph(_WORKER_PIPELINE, text, report_counts, edits) for text in texts]
+    cache = getattr(_WORKER_PIPELINE, "cache", None)
+    if cache: cache.flush()
+    if metrics and cache: metrics.add_cache(_WORKER_PIPELINE, *cache_state)
+    return fixed, report_counts, metrics and metrics.to_dict()
+
+# اصلاح فهرست پاراگراف‌های یک سند و بازگرداندن نتیجه‌ها به همان ترتیب. متن‌های بزرگ‌تر از min_chars
+# به تکه‌های پیوسته میان پردازه‌هایی با زنجیرهٔ آماده پخش و شمارش‌ها به ترتیب تکه‌ها جمع می‌شوند؛
+# بقیه (یا اگر ساخت پردازه ممکن نباشد) با pipeline در همین پردازه. metrics یک PipelineMetrics است.
+# با progress تکه‌ها از BACKGROUND_BATCH_CHARS بزرگ‌تر نمی‌شوند و پس از هر تکه progress(پاراگراف‌های انجام‌شده,
+# نویسه‌های انجام‌شده) فراخوانده می‌شود؛ اگر cancelled (یک threading.Event) میان تکه‌ها روشن شود خروجی None است.
+# با edits هر نتیجه (متن اصلاح‌شده, ویرایش‌ها) است و ویرایش‌ها در همان پردازه‌ای ساخته می‌شوند که متن را اصلاح می‌کند.
+def fix_paragraphs(texts, options, report_counts, pipeline=None, workers=None, replacements_path=None,
+                   cache_path=None, metrics=None, min_chars=PARALLEL_MIN_CHARS, progress=None, cancelled=None, edits=False):
+    texts = list(texts)
+    workers, total = workers or os.cpu_count() or 1, sum(map(len, texts))
+    batches = max(1, -(-total // BACKGROUND_BATCH_CHARS)) if progress else 1
+    context = process_context() if workers > 1 and total >= min_chars else False
+    if context is not False:
         try:
-            url = doc.URL
-            if not url: folder, filename = os.path.expanduser("~"), "Untitled"
-            else: folder, filename = os.path.dirname(unquote(urlparse(url).path)), os.path.basename(unquote(urlparse(url).path))
-            now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-            report_path = os.path.join(folder, f"Paknevis Report [{now}].txt")
-            with open(report_path, "w", encoding="utf-8") as f:
-                f.write(f"نام فایل: {filename}\n\nمجموع اصلاحات: {en_numbers_to_fa(str(total))}\n")
-                for k,v in report_counts.items():
-                    if v>0: f.write(f"{k}: {en_numbers_to_fa(str(v))}\n")
-        except Exception as e: log_error("fix_text_full - write report file", e)
+            pool = get_paragraph_pool(options, workers, replacements_path, cache_path, metrics is not None, context)
+            chunks = split_chunks(texts, max(workers * PARALLEL_CHUNKS_PER_WORKER, batches))
+            futures, results, done, chars = [pool.submit(fix_paragraph_chunk, chunk, edits) for chunk in chunks], [], 0, 0
+            try:
+                for future, chunk in zip(futures, chunks):
+                    if cancelled is not None and cancelled.is_set(): return None
+                    results.append(future.result())
+                    done, chars = done + len(chunk), chars + sum(map(len, chunk))
+                    if progress: progress(done, chars)
+            finally:
+                for future in futures: future.cancel()
+            fixed = []
+            for chunk, counts, chunk_metrics in results:
+                fixed += chunk
+                merge_report_counts(report_counts, counts)
+                if metrics is not None and chunk_metrics: metrics.merge(chunk_metrics)
+            return fixed
+        except Exception as e:
+            log_error("fix_paragraphs - process pool", e)
+            shutdown_paragraph_pool()
+    pipeline = pipeline or get_pipeline(options)
+    if not progress: return [fix_paragraph(pipeline, text, report_counts, edits) for text in texts]
+    fixed, chars = [], 0
+    for chunk in split_chunks(texts, batches) if texts else ():
+        if cancelled is not None and cancelled.is_set(): return None
+        fixed += [fix_paragraph(pipeline, text, report_counts, edits) for text in chunk]
+        chars += sum(map(len, chunk))
+        progress(len(fixed), chars)
+    return fixed
 
-    except Exception as e: log_error("fix_text_full", e)
+# fix_many پردازهٔ جاری (پس از init_batch_worker)
+def worker_fix_paragraphs(texts, report_counts):
+    options, replacements_path, cache_path, metrics = _WORKER_ARGS
+    return fix_paragraphs(texts, options, report_counts, _WORKER_PIPELINE, _WORKER_PARALLEL, replacements_path,
+                          cache_path, _WORKER_MEASURED.metrics if _WORKER_MEASURED else None)
+
+# نوشتن فایل با جایگزینی اتمی تا فایل اصلی در صورت خطا نیمه‌کاره نماند
+def write_text_atomic(path, text):
+    tmp_path = path + ".paknevis-tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+# فهرست (مسیر ورودی, مسیر نسبی) همهٔ فایل‌های متنی؛ پوشه‌ها به ترتیب ثابت پیموده می‌شوند
+def iter_text_files(paths):
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path, os.path.basename(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(TEXT_FILE_EXTENSIONS):
+                    full = os.path.join(root, name)
+                    yield full, os.path.relpath(full, path)
+
+_WORKER_PIPELINE = _WORKER_MEASURED = _WORKER_ARGS = None
+_WORKER_PARALLEL, _WORKER_PREVIEW = 1, False
+
+# آماده‌سازی هر پردازه: بارگذاری بانک و ساخت زنجیره فقط یک بار برای همهٔ فایل‌های آن پردازه.
+# با parallel بیش از ۱ پاراگراف‌های هر فایل متنی بزرگ میان همین تعداد پردازه پخش می‌شوند.
+# با preview فایل‌ها فقط خوانده و ویرایش‌های پیشنهادی گردآوری می‌شوند.
+def init_batch_worker(options, replacements_path=None, cache_path=None, metrics=False, parallel=1, preview=False):
+    global _WORKER_PIPELINE, _WORKER_MEASURED, _WORKER_ARGS, _WORKER_PARALLEL, _WORKER_PREVIEW
+    _WORKER_ARGS, _WORKER_PARALLEL, _WORKER_PREVIEW = (options, replacements_path, cache_path, metrics), parallel, preview
+    if replacements_path: use_replacements(replacements_path)
+    _WORKER_PIPELINE = get_pipeline(options)
+    _WORKER_MEASURED = MeasuredPipeline(_WORKER_PIPELINE, PipelineMetrics()) if metrics else None
+    if _WORKER_MEASURED: _WORKER_PIPELINE = _WORKER_MEASURED
+    if cache_path: _WORKER_PIPELINE = CachedPipeline(_WORKER_PIPELINE, get_paragraph_cache(cache_path))
+    if FixOption.FIX_DICT.name in _WORKER_PIPELINE.key and get_replacements(): get_dict_matcher()
+
+# اصلاح یک فایل؛ خروجی (مسیر, تغییر کرد؟, شمارش‌ها, خطا, سنجش مراحل یا None, ویرایش‌های پیش‌نمایش یا None)
+def fix_file_job(job):
+    import zipfile
+    src, dst = job
+    report_counts = get_initial_report_counts()
+    metrics, cache_state = None, (getattr(_WORKER_PIPELINE, "hits", 0), getattr(_WORKER_PIPELINE, "misses", 0))
+    if _WORKER_MEASURED: metrics = _WORKER_MEASURED.metrics = PipelineMetrics()
+    if _WORKER_PREVIEW: return preview_file_job(src, report_counts, metrics)
+    try:
+        if dst != src: os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+        if src.lower().endswith(OFFICE_FILE_EXTENSIONS):
+            changed = fix_office_file(src, dst, _WORKER_PIPELINE, report_counts)
+        else:
+            with open(src, "r", encoding="utf-8", newline="") as f:
+                old_text = f.read()
+            fix_many = worker_fix_paragraphs if _WORKER_PARALLEL > 1 else None
+            new_text = fix_plain_text(old_text, _WORKER_PIPELINE, report_counts, fix_many)
+            changed = new_text != old_text
+            if changed or dst != src: write_text_atomic(dst, new_text)
+        cache = getattr(_WORKER_PIPELINE, "cache", None)
+        if cache: cache.flush()
+        if metrics and cache: metrics.add_cache(_WORKER_PIPELINE, *cache_state)
+        return src, changed, report_counts, None, metrics and metrics.to_dict(), None
+    except (OSError, UnicodeDecodeError, zipfile.BadZipFile, xml.parsers.expat.ExpatError) as e:
+        return src, False, get_initial_report_counts(), f"{type(e).__name__}: {e}", None, None
+
+# پیش‌نمایش یک فایل بدون نوشتن؛ شمارهٔ پاراگراف در فایل متنی همان شمارهٔ سطر است
+def preview_file_job(src, report_counts, metrics=None):
+    import zipfile
+    preview = PreviewPipeline(get_pipeline(_WORKER_ARGS[0]), metrics)
+    try:
+        if src.lower().endswith(OFFICE_FILE_EXTENSIONS): fix_office_file(src, None, preview, report_counts)
+        else:
+            with open(src, "r", encoding="utf-8", newline="") as f:
+                fix_plain_text(f.read(), preview, report_counts, preview.fix_many)
+        return src, bool(preview.entries), report_counts, None, metrics and metrics.to_dict(), preview.entries
+    except (OSError, UnicodeDecodeError, zipfile.BadZipFile, xml.parsers.expat.ExpatError) as e:
+        return src, False, get_initial_report_counts(), f"{type(e).__name__}: {e}", None, None
+
+# اصلاح گروهی فایل‌ها؛ jobs فهرست (ورودی, خروجی) است و نتیجه‌ها به همان ترتیب برمی‌گردند.
+# با metrics=True عنصر پنجم هر نتیجه سنجش مراحل همان فایل است (خروجی PipelineMetrics.to_dict)
+# و با preview=True عنصر ششم ویرایش‌های پیشنهادی (PreviewPipeline.entries)؛ آن‌گاه چیزی نوشته نمی‌شود.
+def batch_fix_files(jobs, options, workers=None, replacements_path=None, cache_path=None, metrics=False, preview=False):
+    jobs = list(jobs)
+    requested = workers or os.cpu_count() or 1
+    workers = max(1, min(requested, len(jobs)))
+    initargs = (options, replacements_path, cache_path, metrics, 1, preview)
+    if workers == 1:
+        # یک فایل تنها: پردازه‌ها به جای فایل‌ها میان پاراگراف‌های آن پخش می‌شوند
+        init_batch_worker(*initargs[:4], parallel=requested if len(jobs) == 1 else 1, preview=preview)
+        return [fix_file_job(job) for job in jobs]
+    chunksize = max(1, len(jobs) // (workers * 4))
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers, initializer=init_batch_worker, initargs=initargs) as pool:
+        return list(pool.map(fix_file_job, jobs, chunksize=chunksize))
+
+# ---------- آزمون هم‌ارزی با زنجیرهٔ مرجع ----------
+# زنجیرهٔ مرجع توابع سادهٔ مرحله‌ای را یکی‌یکی و به ترتیب اولیه اجرا می‌کند. هر مسیر بهینه باید روی همان
+# ورودی‌ها دقیقاً همان متن و همان شمارش‌ها را بدهد؛ ورودیِ ناهم‌ارز تا کوچک‌ترین نمونه کوچک می‌شود.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+VERIFY_RANDOM_PROFILES = 6       # نمایه‌های تصادفی تنظیمات افزون بر تنظیمات جاری و «همه روشن»
+VERIFY_MAX_FAILURES = 3          # نمونه‌های کوچک‌شده برای هر مسیر
+_REFERENCE_DICT_PATTERN = None   # (بانک, الگو)
+
+# مرجع fix_dict: یک الگوی بزرگ با واژه‌های بلندتر در آغاز، یعنی بلندترین واژهٔ بانک با مرز واژه در هر موضع
+def fix_dict_reference(text, report_counts):
+    global _REFERENCE_DICT_PATTERN
+    replacements = get_replacements()
+    if not replacements: return text
+    if _REFERENCE_DICT_PATTERN is None or _REFERENCE_DICT_PATTERN[0] is not replacements:
+        keys = sorted(replacements, key=len, reverse=True)
+        _REFERENCE_DICT_PATTERN = (replacements, re.compile(r"\b(" + "|".join(map(re.escape, keys)) + r")\b"))
+    def replace_match(m):
+        report_counts["غلط‌های املایی (بانک)"] += 1
+        return replacements[m.group(0)]
+    return _REFERENCE_DICT_PATTERN[1].sub(replace_match, text)
+
+def fix_fake_hyphens_reference(text, report_counts):
+    total_count = 0
+    for ch in CHAR_FIXES[FixOption.FIX_FAKE_HYPHENS.name]:
+        n = text.count(ch)
+        if n: text = text.replace(ch, ZWNJ); total_count += n
+    report_counts["نیم‌فاصلهٔ کاذب"] += total_count
+    return text
+
+REFERENCE_STAGES = [
+    (FixOption.FIX_K_Y, fix_k_y), (FixOption.FIX_NUMBERS_EN, fix_numbers_en_func),
+    (FixOption.FIX_NUMBERS_AR, fix_numbers_ar_func), (FixOption.FIX_PUNCT, fix_punct),
+    (FixOption.FIX_QUOTES, fix_quotes), (FixOption.FIX_HE_YE, fix_he_ye), (FixOption.FIX_ME_NEMI, fix_me_nemi),
+    (FixOption.FIX_PREFIX_VERBS, fix_prefix_verbs), (FixOption.FIX_SUFFIXES, fix_suffixes),
+    (FixOption.FIX_DICT, fix_dict_reference), (FixOption.FIX_SPACES, fix_spaces),
+    (FixOption.FIX_SPACE_BEFORE_PUNCT, fix_space_before_punct), (FixOption.FIX_EXTRA_SPACES, fix_extra_spaces),
+    (FixOption.FIX_ELLIPSIS, fix_ellipsis), (FixOption.FIX_FAKE_HYPHENS, fix_fake_hyphens_reference),
+]
+
+def reference_fix_all(text, options, report_counts):
+    for option, stage in REFERENCE_STAGES:
+        if options.get(option.name, True): text = stage(text, report_counts)
+    return text
+
+# مسیرهای هر پاراگراف جدا: نام → تابع(متن, تنظیمات, شمارش‌ها)
+def edits_fix_all(text, options, report_counts):
+    return apply_edits(text, get_pipeline(options).edits(text, report_counts)[1])
+
+VERIFY_PATHS = {"fix_all": fix_all, "edits": edits_fix_all}
+
+# ---------- ورودی‌های آزمون هم‌ارزی ----------
+VERIFY_WORDS = ["کتاب", "خانه", "می", "نمی", "روم", "رفت", "شد", "شده", "ها", "های", "هایشان", "تر", "ترین", "ام",
+                "اش", "م", "ت", "ش", "ی", "ه", "بر", "در", "فرا", "باز", "گرفتن", "گشتن", "که", "خواهد", "میروند",
+                "رفته", "اند", "ند", "ید", "كتاب", "يك", "12", "٣٤", "3.5", "۱۲", "hello", "x_1"]
+VERIFY_SEPARATORS = [" ", "  ", "   ", "\t", ZWNJ, "", "\n"] + list(CHAR_FIXES[FixOption.FIX_FAKE_HYPHENS.name])
+VERIFY_PUNCT = [",", ";", "?", "??", "؟؟", "!!", "!", "$", "%", ".", "...", "....", "،", "؛", ":", "«", "»",
+                "(", ")", "[", "]", "{", "}", "⟨", "⟩", '"', "'", "“", "”", "‘", "’", "ٔ", "-", "/"]
+VERIFY_CONTEXTS = ["{}", "این {} است.", "«{}»", "({}) ؟", "{} ها", "{}‌ها", "می {}", "{0}، {0} ...", "{}ی", "{} ام"]
+
+# متن‌های ساختگی پرخطر: واژه‌ها، پسوندها و بانک واژه‌ها درهم با فاصله‌ها و علامت‌های گوناگون
+def generate_verify_texts(rnd, count, bank_words=()):
+    words = VERIFY_WORDS + list(bank_words)
+    texts = []
+    for _ in range(count):
+        pieces = []
+        for _ in range(rnd.randint(0, 25)):
+            kind = rnd.random()
+            pieces.append(rnd.choice(words) if kind < 0.5 else rnd.choice(VERIFY_SEPARATORS) if kind < 0.8 else rnd.choice(VERIFY_PUNCT))
+        texts.append("".join(pieces))
+    return texts
+
+# هر واژهٔ بانک (غلط و درست) در چند بافت
+def bank_context_texts(replacements):
+    return [context.format(word) for wrong, correct in (replacements or {}).items()
+            for word in (wrong, correct) for context in VERIFY_CONTEXTS]
+
+# پاراگراف‌های فایل‌های واقعی (متنی: هر سطر؛ ‎.odt/.docx‎: هر پاراگراف)
+class _CollectingPipeline:
+    key = ()
+    def __init__(self): self.texts = []
+    def run(self, text, report_counts):
+        self.texts.append(text)
+        return text
+
+def corpus_texts(paths):
+    collector = _CollectingPipeline()
+    for src, _ in iter_text_files(paths):
+        if src.lower().endswith(OFFICE_FILE_EXTENSIONS): fix_office_file(src, None, collector, {})
+        else:
+            with open(src, "r", encoding="utf-8", newline="") as f:
+                collector.texts.extend(line.rstrip("\r") for line in f.read().split("\n"))
+    return [text for text in collector.texts if text]
+
+# ---------- اجرای آزمون هم‌ارزی ----------
+def verify_profiles(options, rnd):
+    names = [option.name for option in FixOption]
+    profiles = [{name: options.get(name, True) for name in names}, {name: True for name in names}]
+    profiles += [{name: rnd.random() < 0.7 for name in names} for _ in range(VERIFY_RANDOM_PROFILES)]
+    unique = {}
+    for profile in profiles: unique.setdefault(options_key(profile), profile)
+    return list(unique.values())
+
+# خروجی (متن, شمارش‌ها) مرجع و مسیر برای یک متن
+def compare_one(path, text, options):
+    expected_counts, got_counts = get_initial_report_counts(), get_initial_report_counts()
+    expected = reference_fix_all(text, options, expected_counts)
+    got = path(text, options, got_counts)
+    return (expected, expected_counts), (got, got_counts)
+
+def is_mismatch(path, text, options):
+    expected, got = compare_one(path, text, options)
+    return expected[0].encode("utf-8") != got[0].encode("utf-8") or expected[1] != got[1]
+
+# کوچک‌ترین ورودی و کمترین گزینه‌هایی که ناهم‌ارزی را نگه می‌دارند (حذف تکه‌هایی که هر بار نصف می‌شوند)
+def minimize_failure(path, text, options):
+    chunk = max(len(text) // 2, 1)
+    while text:
+        i, progress = 0, False
+        while i < len(text):
+            candidate = text[:i] + text[i + chunk:]
+            if is_mismatch(path, candidate, options): text, progress = candidate, True
+            else: i += chunk
+        if not progress:
+            if chunk == 1: break
+            chunk //= 2
+    for name in [name for name, enabled in options.items() if enabled]:
+        trial = dict(options, **{name: False})
+        if is_mismatch(path, text, trial): options = trial
+    return text, options
+
+def describe_failure(name, text, options):
+    expected, got = compare_one(VERIFY_PATHS.get(name, fix_all), text, options)
+    diff = {k: (expected[1][k], got[1].get(k, 0)) for k in expected[1] if expected[1][k] != got[1].get(k, 0)}
+    return {"path": name, "text": text, "options": [name for name, enabled in options.items() if enabled],
+            "expected": expected[0], "got": got[0], "counts": diff}
+
+# اجرای همهٔ مسیرها روی همهٔ ورودی‌ها با همهٔ نمایه‌ها؛ خروجی گزارشی با زمان، شتاب و ناهم‌ارزی‌های کوچک‌شده.
+# با workers بیش از ۱ مسیر موازی fix_paragraphs هم (روی کل فهرست) سنجیده می‌شود.
+def verify_equivalence(texts, profiles, workers=1, replacements_path=None):
+    paths = dict(VERIFY_PATHS)
+    if workers > 1: paths["parallel"] = None
+    result = {name: {"seconds": 0.0, "mismatches": 0, "failures": []} for name in paths}
+    reference_seconds = 0.0
+    for options in profiles:
+        # گرم کردن زنجیره‌ها و الگوی مرجع بیرون از زمان‌سنجی
+        for path in VERIFY_PATHS.values(): path(texts[0] if texts else "", options, get_initial_report_counts())
+        reference_fix_all(texts[0] if texts else "", options, get_initial_report_counts())
+        started = time.perf_counter()
+        expected = []
+        for text in texts:
+            counts = get_initial_report_counts()
+            expected.append((reference_fix_all(text, options, counts), counts))
+        reference_seconds += time.perf_counter() - started
+        for name, path in paths.items():
+            entry = result[name]
+            started = time.perf_counter()
+            if path is None:
+                totals = get_initial_report_counts()
+                fixed = fix_paragraphs(texts, options, totals, workers=workers, replacements_path=replacements_path, min_chars=0)
+                entry["seconds"] += time.perf_counter() - started
+                expected_totals = get_initial_report_counts()
+                for _, counts in expected: merge_report_counts(expected_totals, counts)
+                bad = [i for i, (got, (want, _)) in enumerate(zip(fixed, expected)) if got != want]
+                if bad or totals != expected_totals or len(fixed) != len(texts):
+                    entry["mismatches"] += max(len(bad), 1)
+                    if len(entry["failures"]) < VERIFY_MAX_FAILURES:
+                        entry["failures"].append({"path": name, "options": [k for k, v in options.items() if v],
+                                                  "paragraphs": bad[:10], "counts_equal": totals == expected_totals})
+                continue
+            got = []
+            for text in texts:
+                counts = get_initial_report_counts()
+                got.append((path(text, options, counts), counts))
+            entry["seconds"] += time.perf_counter() - started
+            for text, (want, want_counts), (have, have_counts) in zip(texts, expected, got):
+                if want.encode("utf-8") == have.encode("utf-8") and want_counts == have_counts: continue
+                entry["mismatches"] += 1
+                if len(entry["failures"]) < VERIFY_MAX_FAILURES:
+                    entry["failures"].append(describe_failure(name, *minimize_failure(path, text, options)))
+    for entry in result.values():
+        entry["speedup"] = reference_seconds / entry["seconds"] if entry["seconds"] else None
+    return {"paragraphs": len(texts), "profiles": len(profiles), "reference_seconds": reference_seconds, "paths": result}
+
+def verify_main(args, options):
+    replacements_path = args.dict
+    if not replacements_path and not os.path.exists(default_replacements_source()):
+        bundled = os.path.join(SCRIPT_DIR, "DocumentList.json")
+        replacements_path = bundled if os.path.exists(bundled) else None
+    if replacements_path: use_replacements(replacements_path)
+    replacements = get_replacements()
+    import random
+    rnd = random.Random(args.seed)
+    paths = args.paths or [path for path in [os.path.join(SCRIPT_DIR, "نمونه.odt")] if os.path.exists(path)]
+    corpus = corpus_texts(paths)
+    bank = bank_context_texts(replacements)
+    texts = generate_verify_texts(rnd, args.verify, list(replacements or ())[:200]) + bank + corpus
+    report = verify_equivalence(texts, verify_profiles(options, rnd), args.jobs or 1, replacements_path)
+    report["inputs"] = {"generated": args.verify, "bank": len(bank), "corpus": len(corpus)}
+    lines = [f"پاراگراف‌ها: {report['paragraphs']} (ساختگی {args.verify}، بانک {len(bank)}، پیکره {len(corpus)})، "
+             f"نمایه‌ها: {report['profiles']}، مرجع: {report['reference_seconds']:.2f}s"]
+    for name, entry in report["paths"].items():
+        status = "هم‌ارز" if not entry["mismatches"] else f"ناهم‌ارز ({entry['mismatches']})"
+        speedup = f"{entry['speedup']:.2f}x" if entry["speedup"] else "-"
+        lines.append(f"{name}: {status}، {entry['seconds']:.2f}s، شتاب {speedup}")
+        for failure in entry["failures"]: lines.append("  " + json.dumps(failure, ensure_ascii=False))
+    print("\n".join(lines), file=sys.stderr)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if any(entry["mismatches"] for entry in report["paths"].values()) else 0
+
+# ---------- سرویس محلی (اصلاح پیوسته برای برنامه‌های دیگر) ----------
+SERVE_ADDRESS = "127.0.0.1:8765"
+SERVE_SPLIT_CHARS = 20000        # دسته‌های بزرگ‌تر از این میان پردازه‌ها پخش می‌شوند
+SERVE_MAX_BODY = 64 << 20
+
+# اصلاح یک دسته متن با زنجیرهٔ گرم تنظیمات options؛ خروجی (متن‌ها, شمارش‌ها, زمان, سنجش مراحل یا None)
+def serve_fix_job(job):
+    options, texts, measure = job
+    started = time.perf_counter()
+    report_counts, pipeline = get_initial_report_counts(), get_pipeline(options)
+    metrics = PipelineMetrics() if measure else None
+    if metrics: pipeline = MeasuredPipeline(pipeline, metrics)
+    fixed = [pipeline.run(text, report_counts) if text else text for text in texts]
+    return fixed, report_counts, time.perf_counter() - started, metrics and metrics.to_dict()
+
+class FixService:
+    """هستهٔ سرویس: هر درخواست JSON با زنجیرهٔ گرمِ نمایهٔ تنظیماتش (تنظیمات پایه به‌علاوهٔ options درخواست)
+    اصلاح می‌شود. با workers بیش از ۱ کار روی پردازه‌هایی انجام می‌شود که بانک واژه‌ها را یک بار بارگذاری کرده‌اند
+    و زنجیرهٔ هر نمایه را پس از نخستین درخواست نگه می‌دارند."""
+
+    def __init__(self, options, workers=1, replacements_path=None):
+        self.options, self.workers = dict(options), workers
+        init_batch_worker(self.options, replacements_path)
+        self.pool = None
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            self.pool = ProcessPoolExecutor(workers, initializer=init_batch_worker, initargs=(self.options, replacements_path))
+        self.lock, self.started = threading.Lock(), time.time()
+        self.requests = self.paragraphs = 0
+        self.profiles = {options_key(self.options)}
+
+    # تنظیمات یک درخواست: options غیر شیء یا گزینه‌های ناشناخته خطای ValueError می‌دهند
+    def profile(self, overrides):
+        if overrides is None: overrides = {}
+        if not isinstance(overrides, dict): raise ValueError("\"options\" must be a JSON object")
+        options = dict(self.options)
+        for name, value in overrides.items():
+            if name not in FixOption.__members__: raise ValueError(f"unknown option: {name}")
+            options[name] = bool(value)
+        return options
+
+    # درخواست {"text": ...} یا {"texts": [...]} با options و metrics اختیاری؛ پاسخ متن‌ها، شمارش‌ها و زمان‌هاست
+    def handle(self, request):
+        started = time.perf_counter()
+        if not isinstance(request, dict): raise ValueError("request must be a JSON object")
+        single = "text" in request
+        texts = [request["text"]] if single else request.get("texts")
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            raise ValueError("expected \"text\" (string) or \"texts\" (list of strings)")
+        options, measure = self.profile(request.get("options")), bool(request.get("metrics"))
+        if self.pool and len(texts) > 1 and sum(map(len, texts)) >= SERVE_SPLIT_CHARS:
+            jobs = [(options, chunk, measure) for chunk in split_chunks(texts, self.workers)]
+            results = list(self.pool.map(serve_fix_job, jobs))
+        elif self.pool: results = [self.pool.submit(serve_fix_job, (options, texts, measure)).result()]
+        else: results = [serve_fix_job((options, texts, measure))]
+        fixed, report_counts, work, stage_metrics = [], get_initial_report_counts(), 0.0, {}
+        for chunk, counts, seconds, chunk_metrics in results:
+            fixed += chunk; work += seconds
+            merge_report_counts(report_counts, counts)
+            if chunk_metrics: merge_metrics(stage_metrics, chunk_metrics)
+        with self.lock:
+            self.requests += 1; self.paragraphs += len(texts)
+            self.profiles.add(options_key(options))
+        # seconds زمان کل درخواست در سرویس است و work_seconds زمان اصلاح در پردازه‌ها
+        response = {"text": fixed[0]} if single else {"texts": fixed}
+        response.update(counts=report_counts, total=sum(report_counts.values()),
+                        seconds=time.perf_counter() - started, work_seconds=work)
+        if measure: response["metrics"] = stage_metrics
+        return response
+
+    def status(self):
+        with self.lock:
+            return {"requests": self.requests, "paragraphs": self.paragraphs, "profiles": len(self.profiles),
+                    "workers": self.workers, "uptime_seconds": time.time() - self.started}
+
+    def close(self):
+        if self.pool: self.pool.shutdown(cancel_futures=True)
+
+_FIX_SERVER_CLASSES = None
+
+# کلاس‌های سرویس فقط برای --serve ساخته می‌شوند تا http.server و socketserver در ماکرو بارگذاری نشوند.
+# خروجی (FixRequestHandler, UnixFixServer, ThreadingHTTPServer)
+def fix_server_classes():
+    global _FIX_SERVER_CLASSES
+    if _FIX_SERVER_CLASSES: return _FIX_SERVER_CLASSES
+    import socketserver
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class FixRequestHandler(BaseHTTPRequestHandler):
+        """POST /fix با بدنهٔ JSON و GET /status؛ اتصال برای درخواست‌های پیاپی باز می‌ماند."""
+
+        protocol_version = "HTTP/1.1"
+
+        # بدون Nagle پاسخ کوتاه روی اتصال ماندگار TCP منتظر تأیید بستهٔ قبلی نمی‌ماند (سوکت یونیکس این گزینه را ندارد)
+        def setup(self):
+            self.disable_nagle_algorithm = not isinstance(self.server, UnixFixServer)
+            super().setup()
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/fix": return self.send_json(404, {"error": "not found"})
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > SERVE_MAX_BODY: return self.send_json(413, {"error": "request too large"})
+            try: status, response = 200, self.server.service.handle(json.loads(self.rfile.read(length)))
+            except (ValueError, TypeError) as e: status, response = 400, {"error": str(e)}
+            except Exception as e:
+                log_error("FixRequestHandler", e)
+                status, response = 500, {"error": f"{type(e).__name__}: {e}"}
+            self.send_json(status, response)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/status": self.send_json(200, self.server.service.status())
+            else: self.send_json(404, {"error": "not found"})
+
+        def send_json(self, status, data):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        # هر درخواست گزارش نمی‌شود؛ سوکت یونیکس نشانی کلاینت ندارد
+        def log_message(self, format, *args): pass
+        def address_string(self): return str(self.client_address[0]) if self.client_address else "unix"
+
+    class UnixFixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    _FIX_SERVER_CLASSES = (FixRequestHandler, UnixFixServer, ThreadingHTTPServer)
+    return _FIX_SERVER_CLASSES
+
+LOOPBACK_HOSTS = ("localhost", "")
+
+# نشانی سرویس به صورت ("unix", مسیر) یا ("tcp", (میزبان, درگاه)). سرویس فقط برای همین رایانه است،
+# پس میزبانی جز localhost یا نشانی loopback نسخهٔ ۴ (127.x.x.x) خطای ValueError می‌دهد.
+def parse_serve_address(address):
+    if address.startswith("unix:") or "/" in address:
+        return "unix", address[5:] if address.startswith("unix:") else address
+    host, _, port = address.rpartition(":")
+    if host not in LOOPBACK_HOSTS:
+        import ipaddress
+        try: loopback = ipaddress.IPv4Address(host).is_loopback
+        except ValueError: loopback = False
+        if not loopback: raise ValueError(f"only localhost or 127.x.x.x can be served, not {host!r}")
+    if not port.isdigit(): raise ValueError(f"invalid port: {port!r}")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+# «میزبان:درگاه» (پیش‌فرض 127.0.0.1) یا مسیر سوکت یونیکس (با / یا پیشوند unix:)
+def make_fix_server(address, service):
+    import stat
+    handler, unix_server, tcp_server = fix_server_classes()
+    kind, target = parse_serve_address(address)
+    if kind == "unix":
+        # سوکت به‌جامانده از اجرای قبلی پاک می‌شود، ولی هیچ فایل دیگری
+        if os.path.exists(target) and stat.S_ISSOCK(os.stat(target).st_mode): os.remove(target)
+        server = unix_server(target, handler)
+    else: server = tcp_server(target, handler)
+    server.service = service
+    return server
+
+def serve(address, options, workers=1, replacements_path=None):
+    import signal
+    service = FixService(options, workers, replacements_path)
+    server = make_fix_server(address, service)
+    print(f"PAKNEVIS: {address}", file=sys.stderr)
+    # پایان با SIGTERM هم مثل Ctrl+C پردازه‌ها و سوکت را جمع می‌کند
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try: server.serve_forever()
+    except KeyboardInterrupt: pass
+    finally:
+        server.server_close(); service.close()
+        if isinstance(server, fix_server_classes()[1]) and os.path.exists(server.server_address): os.remove(server.server_address)
+    return 0
+
+def build_arg_parser():
+    option_names = [option.name for option in FixOption]
+    parser = argparse.ArgumentParser(prog="PAKNEVIS.py", description="پاک‌نویس: اصلاح متن فارسی بدون لیبره‌آفیس")
+    parser.add_argument("paths", nargs="*", help="فایل‌ها یا پوشه‌ها (.txt، .md، .odt و .docx)؛ بدون مسیر یا با - از ورودی استاندارد می‌خواند")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("-i", "--in-place", action="store_true", help="بازنویسی خود فایل‌ها")
+    target.add_argument("-o", "--output-dir", help="پوشهٔ خروجی (ساختار پوشه‌ها حفظ می‌شود)")
+    target.add_argument("-n", "--dry-run", action="store_true", help="فقط چاپ ویرایش‌های پیشنهادی (مسیر:پاراگراف:ستون)؛ چیزی نوشته نمی‌شود")
+    parser.add_argument("-c", "--config", help="فایل تنظیمات به قالب TextFixer.conf (پیش‌فرض: تنظیمات کاربر)")
+    parser.add_argument("--enable", action="append", default=[], choices=option_names, metavar="OPTION", help="روشن کردن یک گزینه")
+    parser.add_argument("--disable", action="append", default=[], choices=option_names, metavar="OPTION", help="خاموش کردن یک گزینه")
+    parser.add_argument("-d", "--dict", help="بانک واژه‌ها (DocumentList.json یا DocumentList.xml)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="تعداد پردازه‌ها")
+    parser.add_argument("--report", help="نوشتن گزارش تجمیعی به صورت JSON در این فایل")
+    parser.add_argument("--cache", nargs="?", const=CACHE_FILE, help="حافظهٔ نهان پاراگراف‌ها برای اجراهای تکراری (پیش‌فرض: %(const)s)")
+    parser.add_argument("--metrics", help="نوشتن زمان و کار هر مرحله به صورت JSON در این فایل")
+    parser.add_argument("--verify", nargs="?", type=int, const=20000, metavar="N",
+                        help="آزمون هم‌ارزی مسیرهای بهینه با زنجیرهٔ مرجع روی N متن ساختگی (پیش‌فرض: %(const)s)، "
+                             "واژه‌های بانک و مسیرهای داده‌شده (پیش‌فرض: نمونه.odt)")
+    parser.add_argument("--seed", type=int, default=0, help="بذر متن‌ها و نمایه‌های ساختگی --verify")
+    parser.add_argument("--serve", nargs="?", const=SERVE_ADDRESS, metavar="ADDRESS",
+                        help="اجرای سرویس محلی HTTP روی میزبان:درگاه یا سوکت یونیکس (پیش‌فرض: %(const)s)")
+    return parser
+
+# تنظیمات حاصل از فایل تنظیمات و گزینه‌های --enable/--disable
+def options_from_args(args):
+    options = load_config(args.config)
+    for name in args.enable: options[name] = True
+    for name in args.disable: options[name] = False
+    return options
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    options = options_from_args(args)
+    if args.serve:
+        if args.paths: parser.error("--serve مسیر فایل نمی‌گیرد")
+        try: parse_serve_address(args.serve)
+        except ValueError as e: parser.error(f"--serve: {e}")
+        return serve(args.serve, options, args.jobs or 1, args.dict)
+    if args.verify is not None: return verify_main(args, options)
+    totals, errors, files, changed, stage_metrics = get_initial_report_counts(), [], 0, 0, {}
+    started = time.perf_counter()
+
+    if not args.paths or args.paths == ["-"]:
+        if args.in_place or args.output_dir: parser.error("ورودی استاندارد فقط به خروجی استاندارد نوشته می‌شود")
+        init_batch_worker(options, args.dict, args.cache, bool(args.metrics), args.jobs)
+        old_text = sys.stdin.read()
+        if args.dry_run:
+            preview = PreviewPipeline(get_pipeline(options), _WORKER_MEASURED and _WORKER_MEASURED.metrics)
+            fix_plain_text(old_text, preview, totals, preview.fix_many)
+            for entry in preview.entries: print(f"-:{format_preview_entry(entry)}")
+            was_changed = bool(preview.entries)
+        else:
+            new_text = fix_plain_text(old_text, _WORKER_PIPELINE, totals, worker_fix_paragraphs)
+            sys.stdout.write(new_text)
+            was_changed = new_text != old_text
+        if _WORKER_MEASURED:
+            if args.cache: _WORKER_MEASURED.metrics.add_cache(_WORKER_PIPELINE)
+            merge_metrics(stage_metrics, _WORKER_MEASURED.metrics.to_dict())
+        if args.cache: get_paragraph_cache(args.cache).close()
+        files, changed = 1, int(was_changed)
+    else:
+        if not (args.in_place or args.output_dir or args.dry_run):
+            parser.error("یکی از -i/--in-place، -o/--output-dir یا -n/--dry-run لازم است")
+        jobs = [(src, os.path.join(args.output_dir, rel) if args.output_dir else src) for src, rel in iter_text_files(args.paths)]
+        for src, was_changed, report_counts, error, metrics, entries in batch_fix_files(
+                jobs, options, args.jobs, args.dict, args.cache, bool(args.metrics), args.dry_run):
+            files += 1; changed += was_changed
+            for entry in entries or (): print(f"{src}:{format_preview_entry(entry)}")
+            if error: errors.append(f"{src}: {error}")
+            merge_report_counts(totals, report_counts)
+            if metrics: merge_metrics(stage_metrics, metrics)
+
+    total = sum(totals.values())
+    summary = [f"فایل‌ها: {en_numbers_to_fa(str(files))}، تغییرکرده: {en_numbers_to_fa(str(changed))}",
+               f"مجموع اصلاحات: {en_numbers_to_fa(str(total))}"] + format_report_lines(totals)
+    print("\n".join(summary + errors), file=sys.stderr)
+    if args.report:
+        report = {"files": files, "changed": changed, "total": total, "counts": totals, "errors": errors}
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.metrics:
+        # seconds جمع زمان پردازه‌هاست و wall_seconds زمان واقعی کل اجرا
+        stage_metrics["wall_seconds"] = time.perf_counter() - started
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            json.dump(stage_metrics, f, ensure_ascii=False, indent=2)
+    return 1 if errors else 0
+
+g_exportedScripts = (fix_text_full, toggle_live_mode, preview_fixes)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""سنجهٔ کارایی پاک‌نویس.
+
+پیکره‌های مصنوعی و تکرارپذیر فارسی (جمله‌های ساده، جدول‌های پرعدد، گفت‌وگوی پرگیومه و متن پر از
+غلط‌های بانک) در چند اندازه و چند میزان آلودگی ساخته می‌شوند و سرعت (نویسه بر ثانیه) و اوج حافظهٔ
+هر مرحلهٔ FixPipeline (روی همان متنی که در زنجیره به آن می‌رسد) و fix_all با ترکیب‌های مختلف
+FixOption اندازه‌گیری می‌شود. PAKNEVIS بدون uno هم
+بارگذاری می‌شود، پس برای اجرا لیبره‌آفیس لازم نیست.
+
+    python3 benchmarks/bench_paknevis.py --save-baseline bench-baseline.json
+    python3 benchmarks/bench_paknevis.py --baseline bench-baseline.json
+"""
+import os
+import sys
+import json
+import copy
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import PAKNEVIS as P
+
+BANK_FILE = os.path.join(REPO_DIR, "DocumentList.json")
+SIZES = {"small": 20_000, "medium": 200_000, "large": 2_000_000}
+# احتمال آلوده شدن هر واژه یا علامت
+DIRTINESS = {"clean": 0.0, "light": 0.05, "heavy": 0.3}
+
+# ---------- واژگان ----------
+ZWNJ = P.ZWNJ
+NOUNS = ["کتاب", "خانه", "دانشگاه", "زبان", "نویسنده", "شهر", "مدرسه", "پرسش", "روز", "سال", "کار",
+         "دوست", "راه", "جهان", "مردم", "نامه", "درخت", "فرهنگ", "تاریخ", "کوچه", "پنجره", "ترانه"]
+ADJECTIVES = ["بزرگ", "کوچک", "زیبا", "تازه", "کهن", "روشن", "سخت", "آرام", "ساده", "دشوار"]
+VERBS = ["می‌روم", "می‌شود", "نمی‌دانم", "می‌خوانند", "برگشت", "فراگرفت", "بازگشت", "رفته‌ام",
+         "گفته‌اند", "آمد", "نوشته‌ایم", "می‌نویسد", "درآمد", "نمی‌آید"]
+FUNCTION_WORDS = ["و", "در", "به", "از", "که", "این", "آن", "با", "برای", "را", "تا", "هم"]
+SPEAKERS = ["مریم", "علی", "استاد", "راوی", "مادربزرگ"]
+FAKE_HYPHENS = list(P.CHAR_FIXES[P.FixOption.FIX_FAKE_HYPHENS.name])
+
+# ---------- آلوده‌سازی ----------
+def dirty_word(rnd, word):
+    choice = rnd.randrange(6)
+    if choice == 0: return word.replace("ک", "ك").replace("ی", "ي")
+    if choice == 1: return word.replace(ZWNJ, " ") if ZWNJ in word else word + " ها"
+    if choice == 2: return word.replace(ZWNJ, rnd.choice(FAKE_HYPHENS)) if ZWNJ in word else word + "  "
+    if choice == 3: return word + " ی" if word.endswith("ه") else word.replace(ZWNJ, "")
+    if choice == 4: return rnd.choice(["در ", "بر ", "باز "]) + word
+    return word + " ام"
+
+def dirty_punct(rnd, punct):
+    return rnd.choice({"،": [",", " ،"], "؛": [";", " ؛"], "؟": ["?", "??", " ؟"],
+                       ".": [" .", "...", "....."], "!": ["!!", " !"]}.get(punct, [punct]))
+
+def maybe(rnd, dirt, value, make_dirty):
+    return make_dirty(rnd, value) if rnd.random() < dirt else value
+
+# ---------- انواع متن ----------
+def plain_sentence(rnd, dirt):
+    words = []
+    for _ in range(rnd.randint(4, 14)):
+        kind = rnd.random()
+        if kind < 0.4:
+            word = rnd.choice(NOUNS)
+            if rnd.random() < 0.3: word += ZWNJ + "ها"
+            if rnd.random() < 0.2: word += "ٔ" if word.endswith("ه") else ""
+        elif kind < 0.55: word = rnd.choice(ADJECTIVES) + (ZWNJ + "تر" if rnd.random() < 0.2 else "")
+        else: word = rnd.choice(FUNCTION_WORDS)
+        words.append(maybe(rnd, dirt, word, dirty_word))
+        if rnd.random() < 0.08: words[-1] += maybe(rnd, dirt, rnd.choice("،؛"), dirty_punct)
+    words.append(maybe(rnd, dirt, rnd.choice(VERBS), dirty_word))
+    return " ".join(words) + maybe(rnd, dirt, rnd.choice(".؟!"), dirty_punct)
+
+def digits_sentence(rnd, dirt):
+    def number(value):
+        text = str(value)
+        if rnd.random() < dirt: return text if rnd.random() < 0.7 else text.translate(str.maketrans(P.EN_DIGITS, P.AR_DIGITS))
+        return P.en_numbers_to_fa(text)
+    cells = [number(rnd.randint(1, 500)), rnd.choice(NOUNS), number(rnd.randint(1000, 999999)) + " ریال",
+             number(rnd.randint(1, 99)) + maybe(rnd, dirt, "٪", lambda r, p: "%"),
+             "(" + maybe(rnd, dirt, number(rnd.randint(1300, 1404)), lambda r, w: " " + w + " ") + ")"]
+    return maybe(rnd, dirt, " | ", lambda r, p: "  |  ").join(cells)
+
+def dialogue_sentence(rnd, dirt):
+    quote = plain_sentence(rnd, dirt)
+    if rnd.random() < dirt:
+        opening, closing = rnd.choice([('"', '"'), ("“", "”"), ("'", "'"), ("‘", "’")])
+    else:
+        opening, closing = "«", "»"
+    inner = maybe(rnd, dirt, quote, lambda r, q: " " + q + " ")
+    return f"{rnd.choice(SPEAKERS)} گفت: {opening}{inner}{closing}"
+
+def bank_sentence(rnd, dirt, bank):
+    words = plain_sentence(rnd, 0.0).split(" ")
+    for _ in range(rnd.randint(1, 3)):
+        wrong, correct = rnd.choice(bank)
+        words.insert(rnd.randrange(len(words)), wrong if rnd.random() < max(dirt, 0.02) else correct)
+    return " ".join(words)
+
+CORPUS_KINDS = {
+    "plain": lambda rnd, dirt, bank: plain_sentence(rnd, dirt),
+    "digits": lambda rnd, dirt, bank: digits_sentence(rnd, dirt),
+    "dialogue": lambda rnd, dirt, bank: dialogue_sentence(rnd, dirt),
+    "bank": bank_sentence,
+}
+
+# پیکرهٔ تکرارپذیر: فهرست پاراگراف‌هایی با طول ۲۰۰ تا ۹۰۰ نویسه تا رسیدن به اندازهٔ خواسته‌شده
+def make_corpus(kind, dirtiness, size, seed, bank):
+    rnd = random.Random(f"{seed}/{kind}/{dirtiness}/{size}")
+    make_sentence, dirt = CORPUS_KINDS[kind], DIRTINESS[dirtiness]
+    paragraphs, total = [], 0
+    while total < SIZES[size]:
+        target, sentences, length = rnd.randint(200, 900), [], 0
+        while length < target:
+            sentences.append(make_sentence(rnd, dirt, bank)); length += len(sentences[-1]) + 1
+        paragraphs.append(" ".join(sentences)); total += len(paragraphs[-1])
+    return paragraphs
+
+# ---------- اندازه‌گیری ----------
+def option_combinations(mode):
+    everything = {option.name: True for option in P.FixOption}
+    combos = [("defaults", P.FixOption.get_defaults()), ("all", everything)]
+    if mode in ("single", "full"):
+        combos += [(f"only:{option.name}", {name: name == option.name for name in everything}) for option in P.FixOption]
+    if mode == "full":
+        combos += [(f"without:{option.name}", {**everything, option.name: False}) for option in P.FixOption]
+    return combos
+
+def run_once(func, paragraphs):
+    counts = P.get_initial_report_counts()
+    start = time.perf_counter()
+    for paragraph in paragraphs: func(paragraph, counts)
+    return time.perf_counter() - start
+
+def measure(func, paragraphs, repeats):
+    run_once(func, paragraphs[:5])  # گرم کردن زنجیره‌ها و جدول‌ها
+    best = min(run_once(func, paragraphs) for _ in range(repeats))
+    tracemalloc.start()
+    run_once(func, paragraphs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    chars = sum(map(len, paragraphs))
+    return {"chars": chars, "calls": len(paragraphs), "seconds": best,
+            "chars_per_sec": chars / best if best else 0.0, "peak_kib": peak / 1024}
+
+# متنی که هر مرحلهٔ زنجیره واقعاً می‌گیرد: پاراگراف‌ها یک بار از زنجیره می‌گذرند و ورودی هر مرحلهٔ
+# اجراشده (پس از مراحل پیشین و پیش‌پویش) ثبت می‌شود؛ پس جمع زمان مراحل با زمان خود زنجیره می‌خواند
+def stage_inputs(pipeline, paragraphs):
+    inputs = {name: [] for name, _, _ in pipeline.stages}
+    def recorded(name, stage):
+        def run(text, counts):
+            inputs[name].append(text)
+            return stage(text, counts)
+        return run
+    recorder = copy.copy(pipeline)
+    recorder.stages = [(name, recorded(name, stage), triggers) for name, stage, triggers in pipeline.stages]
+    counts = P.get_initial_report_counts()
+    for paragraph in paragraphs: recorder.run(paragraph, counts)
+    return inputs
+
+def selected(args, target, family):
+    return not args.targets or target in args.targets or family in args.targets
+
+def run_benchmarks(args, bank):
+    # مراحل زنجیرهٔ همه‌گزینه‌ها، همان مراحلی که fix_all[all] اجرا می‌کند
+    pipeline = P.FixPipeline({option.name: True for option in P.FixOption})
+    targets = []
+    for label, options in option_combinations(args.combos):
+        target = f"fix_all[{label}]"
+        if selected(args, target, "fix_all"):
+            targets.append((target, lambda text, counts, options=options: P.fix_all(text, options, counts)))
+    results = []
+    for size in args.sizes:
+        for dirtiness in args.dirtiness:
+            for kind in args.kinds:
+                corpus = f"{kind}/{dirtiness}/{size}"
+                paragraphs = make_corpus(kind, dirtiness, size, args.seed, bank)
+                inputs = stage_inputs(pipeline, paragraphs)
+                # مرحله‌ای که پیش‌پویش در این پیکره هرگز اجرایش نکرده سنجه‌ای ندارد
+                runs = [(f"stage:{name}", stage, inputs[name]) for name, stage, _ in pipeline.stages
+                        if inputs[name] and selected(args, f"stage:{name}", "stage")]
+                runs += [(target, func, paragraphs) for target, func in targets]
+                for target, func, texts in runs:
+                    result = {"corpus": corpus, "target": target, **measure(func, texts, args.repeats)}
+                    results.append(result)
+                    if args.verbose: print(format_result(result), file=sys.stderr)
+    return results
+
+# ---------- مقایسه با خط پایه ----------
+def compare_with_baseline(results, baseline, speed_threshold, memory_threshold, memory_floor_kib=64):
+    previous = {(r["corpus"], r["target"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        old = previous.get((result["corpus"], result["target"]))
+        if not old or not old["chars_per_sec"]: continue
+        result["speed_change"] = result["chars_per_sec"] / old["chars_per_sec"] - 1
+        result["memory_change_kib"] = result["peak_kib"] - old["peak_kib"]
+        slower = result["speed_change"] < -speed_threshold
+        # افزایش‌های کوچک حافظه نوفه است
+        heavier = (result["memory_change_kib"] > memory_floor_kib
+                   and result["peak_kib"] > old["peak_kib"] * (1 + memory_threshold))
+        if slower or heavier:
+            result["regression"] = [reason for reason, flag in (("speed", slower), ("memory", heavier)) if flag]
+            regressions.append(result)
+    return regressions
+
+def format_result(result):
+    line = (f"{result['corpus']:<24} {result['target']:<64} {result['seconds'] * 1000:>9,.2f} ms"
+            f" {result['chars_per_sec']:>14,.0f} ch/s {result['peak_kib']:>10,.1f} KiB")
+    if "speed_change" in result:
+        line += f"  {result['speed_change']:+7.1%}"
+    if result.get("regression"):
+        line += "  REGRESSION(" + ",".join(result["regression"]) + ")"
+    return line
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="سنجش سرعت و حافظهٔ مراحل اصلاح پاک‌نویس روی پیکره‌های مصنوعی")
+    split = lambda value: [item for item in value.split(",") if item]
+    parser.add_argument("--sizes", type=split, default=["small", "medium"], help="از میان " + ",".join(SIZES))
+    parser.add_argument("--dirtiness", type=split, default=list(DIRTINESS), help="از میان " + ",".join(DIRTINESS))
+    parser.add_argument("--kinds", type=split, default=list(CORPUS_KINDS), help="از میان " + ",".join(CORPUS_KINDS))
+    parser.add_argument("--targets", type=split, default=[], help="فقط این سنجه‌ها (مثلاً stage:FIX_DICT یا همهٔ مراحل با stage، fix_all)")
+    parser.add_argument("--combos", choices=["basic", "single", "full"], default="single",
+                        help="ترکیب‌های گزینه برای fix_all: basic=پیش‌فرض و همه، single=+ هر گزینه به‌تنهایی، full=+ همه جز یکی")
+    parser.add_argument("--repeats", type=int, default=3, help="بهترین زمان از چند اجرا")
+    parser.add_argument("--seed", default="1404")
+    parser.add_argument("-d", "--dict", default=BANK_FILE, help="بانک غلط‌های املایی (JSON یا DocumentList.xml)")
+    parser.add_argument("-o", "--output", help="نوشتن نتیجه‌ها در فایل JSON")
+    parser.add_argument("--save-baseline", metavar="PATH", help="ذخیرهٔ نتیجه‌ها به عنوان خط پایه")
+    parser.add_argument("--baseline", metavar="PATH", help="مقایسه با خط پایهٔ ذخیره‌شده")
+    parser.add_argument("--speed-threshold", type=float, default=0.15, help="کاهش سرعت مجاز (کسری)")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="افزایش اوج حافظهٔ مجاز (کسری)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="چاپ هر نتیجه هنگام اندازه‌گیری")
+    return parser
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    for value, allowed, name in ((args.sizes, SIZES, "--sizes"), (args.dirtiness, DIRTINESS, "--dirtiness"),
+                                 (args.kinds, CORPUS_KINDS, "--kinds")):
+        unknown = [item for item in value if item not in allowed]
+        if unknown: build_arg_parser().error(f"{name}: {', '.join(unknown)}")
+    bank = sorted(P.use_replacements(args.dict).items())
+    if not bank: print(f"بانک واژه‌ها خالی است: {args.dict}", file=sys.stderr); return 2
+    results = run_benchmarks(args, bank)
+    report = {"python": platform.python_version(), "platform": platform.platform(),
+              "source_version": P.source_version(), "seed": args.seed, "repeats": args.repeats, "results": results}
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_with_baseline(results, json.load(f), args.speed_threshold, args.memory_threshold)
+    for result in results: print(format_result(result))
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=1)
+    if args.baseline:
+        print(f"\n{len(regressions)} پسرفت در {len(results)} اندازه‌گیری", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
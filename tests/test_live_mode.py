@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""آزمون حالت زنده با مدل ساختگی یک پاراگراف: تایپ با چند درنگ و اصلاح پس از هر درنگ."""
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import PAKNEVIS  # noqa: E402
+
+
+class FakeText:
+    """یک پاراگراف؛ مکان‌نمای دیداری همیشه در پایان متن است."""
+    def __init__(self):
+        self.string = ""
+
+    def createTextCursorByRange(self, text_range):
+        return FakeCursor(self, text_range.anchor, text_range.pos)
+
+
+class FakeCursor:
+    def __init__(self, text, anchor, pos=None):
+        self.text, self.anchor, self.pos = text, anchor, anchor if pos is None else pos
+
+    def getText(self): return self.text
+    def getStart(self): return FakeCursor(self.text, min(self.anchor, self.pos))
+    def getString(self): return self.text.string[min(self.anchor, self.pos):max(self.anchor, self.pos)]
+    def collapseToStart(self): self.anchor = self.pos = min(self.anchor, self.pos)
+
+    def setString(self, value):
+        start, end = min(self.anchor, self.pos), max(self.anchor, self.pos)
+        self.text.string = self.text.string[:start] + value + self.text.string[end:]
+        self.anchor, self.pos = start, start + len(value)
+
+    def gotoStartOfParagraph(self, expand):
+        self.pos = 0
+        if not expand: self.anchor = 0
+
+    def gotoEndOfParagraph(self, expand):
+        self.pos = len(self.text.string)
+        if not expand: self.anchor = self.pos
+
+    def gotoRange(self, text_range, expand):
+        self.pos = text_range.anchor
+        if not expand: self.anchor = self.pos
+
+    def goRight(self, count, expand):
+        if self.pos + count > len(self.text.string): return False
+        self.pos += count
+        if not expand: self.anchor = self.pos
+        return True
+
+
+def make_session():
+    text = FakeText()
+    undo = SimpleNamespace(enterUndoContext=lambda title: None, leaveUndoContext=lambda: None)
+    controller = SimpleNamespace(getViewCursor=lambda: FakeCursor(text, len(text.string)))
+    doc = SimpleNamespace(CurrentController=controller, getUndoManager=lambda: undo,
+                          lockControllers=lambda: None, unlockControllers=lambda: None,
+                          addActionLock=lambda: None, removeActionLock=lambda: None)
+    # بدون لیبره‌آفیس سازندهٔ LiveSession (شنونده و AsyncCallback) در دسترس نیست؛ فقط وضعیت لازم برای اصلاح
+    session = PAKNEVIS.LiveSession.__new__(PAKNEVIS.LiveSession)
+    session.doc, session.deadline, session.applying = doc, 0.0, False
+    session.pipeline = PAKNEVIS.get_pipeline({name: True for name in PAKNEVIS.FixOption.get_defaults()})
+    session.tally = PAKNEVIS.get_initial_report_counts()
+    return session, text
+
+
+def type_with_pauses(pieces):
+    session, text = make_session()
+    for piece in pieces:
+        text.string += piece
+        session.fix_current_paragraph()
+    return text.string, session.tally
+
+
+class LiveModeTest(unittest.TestCase):
+    def test_quoted_phrase_typed_in_pauses(self):
+        result, _ = type_with_pauses(['او گفت "سلام', '" و '])
+        self.assertEqual(result, "او گفت «سلام» و ")
+
+    def test_quoted_phrase_typed_word_by_word(self):
+        result, tally = type_with_pauses(["او ", "گفت ", '"سلام', " دوست", '"', " و ", "رفت."])
+        self.assertEqual(result, "او گفت «سلام دوست» و رفت.")
+        self.assertTrue(tally["گیومهٔ انگلیسی"])
+
+    def test_word_at_caret_is_left_alone(self):
+        self.assertEqual(type_with_pauses(["من ت"])[0], "من ت")
+        self.assertEqual(type_with_pauses(["کتاب ها", " و می ر"])[0], "کتاب‌ها و می ر")
+
+
+if __name__ == "__main__":
+    unittest.main()
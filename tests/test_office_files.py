@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""آزمون اصلاح مستقیم پرونده‌های odt و docx: شکست‌های سطر و ارجاع‌های پانویس سر جایشان می‌مانند."""
+import os
+import re
+import sys
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import PAKNEVIS  # noqa: E402
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+ODF_NS = ('xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+          'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"')
+CONTENT_TYPES = ('<?xml version="1.0" encoding="UTF-8"?><Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                 '<Default Extension="xml" ContentType="application/xml"/>'
+                 '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+                 '</Types>')
+
+
+# ساخت پرونده با بخش متنی part، اصلاح آن با همهٔ گزینه‌ها و خواندن همان بخش از خروجی
+def fix_file(extension, part, xml, extra_parts=()):
+    with tempfile.TemporaryDirectory() as tmp:
+        src, dst = os.path.join(tmp, "in" + extension), os.path.join(tmp, "out" + extension)
+        with zipfile.ZipFile(src, "w") as zout:
+            for name, data in extra_parts: zout.writestr(name, data)
+            zout.writestr(part, '<?xml version="1.0" encoding="UTF-8"?>' + xml)
+        options = {name: True for name in PAKNEVIS.FixOption.get_defaults()}
+        PAKNEVIS.fix_office_file(src, dst, PAKNEVIS.get_pipeline(options), PAKNEVIS.get_initial_report_counts())
+        with zipfile.ZipFile(dst) as zin:
+            return zin.read(part).decode("utf-8")
+
+
+def fix_docx(body):
+    return fix_file(".docx", "word/document.xml", '<w:document xmlns:w="%s"><w:body>%s</w:body></w:document>' % (W_NS, body),
+                    [("[Content_Types].xml", CONTENT_TYPES)])
+
+
+def fix_odt(body):
+    xml = fix_file(".odt", "content.xml", "<office:document-content %s><office:body><office:text>%s</office:text></office:body>"
+                   "</office:document-content>" % (ODF_NS, body), [("mimetype", "application/vnd.oasis.opendocument.text")])
+    return xml[xml.index("<office:text>") + len("<office:text>"):xml.index("</office:text>")]
+
+
+def run_texts(xml):
+    return re.findall(r"<w:t[^>]*>([^<]*)</w:t>|(<w:br[^>]*/>|<w:cr/>)", xml)
+
+
+class DocxLineBreakTest(unittest.TestCase):
+    def test_line_break_is_kept_between_lines(self):
+        xml = fix_docx('<w:p><w:r><w:t>کتاب</w:t><w:br/><w:t xml:space="preserve">ها را مي خوانم</w:t></w:r></w:p>')
+        self.assertEqual(run_texts(xml), [("کتاب", ""), ("", "<w:br/>"), ("ها را می‌خوانم", "")])
+
+    def test_break_attributes_and_runs_survive(self):
+        xml = fix_docx('<w:p><w:r><w:t>اول</w:t></w:r><w:r><w:br w:type="page"/></w:r>'
+                       '<w:r><w:t xml:space="preserve">كتاب ها</w:t><w:cr/><w:t>دوم</w:t></w:r></w:p>')
+        self.assertIn('<w:r><w:br w:type="page"/></w:r>', xml)
+        self.assertEqual(run_texts(xml), [("اول", ""), ("", '<w:br w:type="page"/>'), ("کتاب‌ها", ""), ("", "<w:cr/>"), ("دوم", "")])
+
+    def test_footnote_reference_is_a_word_boundary(self):
+        xml = fix_docx('<w:p><w:r><w:t>متن</w:t></w:r><w:r><w:footnoteReference w:id="1"/></w:r>'
+                       '<w:r><w:t xml:space="preserve"> ها و كتاب ها</w:t></w:r><w:r><w:endnoteReference w:id="2"/></w:r></w:p>')
+        self.assertIn('<w:r><w:footnoteReference w:id="1"/></w:r>', xml)
+        self.assertIn('<w:r><w:endnoteReference w:id="2"/></w:r>', xml)
+        self.assertEqual(run_texts(xml), [("متن", ""), (" ها و کتاب‌ها", "")])
+
+
+class OdtLineBreakTest(unittest.TestCase):
+    def test_line_break_round_trip(self):
+        self.assertEqual(fix_odt("<text:p>a<text:line-break/> ها و كتاب ها</text:p>"),
+                         "<text:p>a<text:line-break/> ها و کتاب‌ها</text:p>")
+
+    def test_line_break_inside_span_and_spaces(self):
+        self.assertEqual(fix_odt('<text:p><text:span>کتاب<text:line-break/>ها</text:span> مي روم<text:s text:c="2"/>!!</text:p>'),
+                         '<text:p><text:span>کتاب<text:line-break/>ها</text:span> می‌روم!</text:p>')
+
+    def test_note_is_a_word_boundary(self):
+        body = ('<text:p>متن<text:note text:id="n1"><text:note-citation>1</text:note-citation>'
+                '<text:note-body><text:p>پانويس ها</text:p></text:note-body></text:note> ها</text:p>')
+        self.assertEqual(fix_odt(body), body.replace("پانويس ها", "پانویس‌ها"))
+
+
+if __name__ == "__main__":
+    unittest.main()